@@ -5,6 +5,9 @@ import os
 from routes.recipe_routes import recipe_bp
 from routes.translation_routes import translation_bp
 from routes.spoonacular_routes import spoonacular_bp
+from routes.health_routes import health_bp
+from routes.job_routes import job_bp
+from services.model_service import init_model
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -17,6 +20,11 @@ def create_app():
     app.register_blueprint(recipe_bp)
     app.register_blueprint(translation_bp)
     app.register_blueprint(spoonacular_bp)
+    app.register_blueprint(health_bp)
+    app.register_blueprint(job_bp)
+
+    # Raises on a missing checkpoint or exported model so the app fails at startup
+    init_model()
         
     return app
 
@@ -3,17 +3,174 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+# Required by services.gemini_client, which checks it when the shared client is
+# created; scripts that only run the classifier do not need it
 GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
-if not GEMINI_API_KEY:
-    raise ValueError("GEMINI_API_KEY not found in environment variables")
 
-MODEL_WEIGHTS_PATH = 'Backend/model_weights.pth'
+MODEL_WEIGHTS_PATH = os.getenv('MODEL_WEIGHTS_PATH', 'Backend/model_weights.pth')
+# Memory-map checkpoint weights so every process on the box shares one copy in the page cache
+MODEL_MMAP_WEIGHTS = os.getenv('MODEL_MMAP_WEIGHTS', 'true').lower() == 'true'
 
-GEMINI_API_ENDPOINT = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-flash:generateContent?key={GEMINI_API_KEY}"
+# Dynamic micro-batching of classifier requests
+INFERENCE_MAX_BATCH_SIZE = int(os.getenv('INFERENCE_MAX_BATCH_SIZE', 8))
+INFERENCE_MAX_WAIT_MS = float(os.getenv('INFERENCE_MAX_WAIT_MS', 5))
+
+# Torch threading per process. TORCH_NUM_THREADS=0 splits the CPUs this process
+# may use evenly between the WEB_CONCURRENCY workers on the host. CPU_AFFINITY
+# (e.g. '0-7') is the core set shared by those workers: with WORKER_INDEX
+# (0 to WEB_CONCURRENCY - 1, set per worker by the process manager) each worker
+# is pinned to its own slice of it, otherwise all workers share it.
+WEB_CONCURRENCY = int(os.getenv('WEB_CONCURRENCY', 1))
+TORCH_NUM_THREADS = int(os.getenv('TORCH_NUM_THREADS', 0))
+TORCH_INTEROP_THREADS = int(os.getenv('TORCH_INTEROP_THREADS', 1))
+CPU_AFFINITY = os.getenv('CPU_AFFINITY', '')
+WORKER_INDEX = int(os.getenv('WORKER_INDEX')) if os.getenv('WORKER_INDEX') else None
+
+# Eager torch fast path: channels_last memory format and bfloat16 autocast
+# (bf16 is only enabled on CPUs with native support, e.g. AVX512-BF16/AMX).
+# Converting to channels_last copies the conv weights into private memory in
+# every process, undoing MODEL_MMAP_WEIGHTS, so it defaults to off when weights
+# are memory-mapped; turn it on to trade that memory for faster convolutions.
+INFERENCE_CHANNELS_LAST = os.getenv(
+    'INFERENCE_CHANNELS_LAST', 'false' if MODEL_MMAP_WEIGHTS else 'true'
+).lower() == 'true'
+INFERENCE_BF16_AUTOCAST = os.getenv('INFERENCE_BF16_AUTOCAST', 'false').lower() == 'true'
+
+# Number of dummy forward passes run at startup before reporting ready
+MODEL_WARMUP_ITERATIONS = int(os.getenv('MODEL_WARMUP_ITERATIONS', 3))
+
+# INT8 CPU inference: 'none', 'dynamic' or 'static' (calibrated on sample images)
+MODEL_QUANTIZATION = os.getenv('MODEL_QUANTIZATION', 'none')
+QUANTIZATION_CALIBRATION_DIR = os.getenv('QUANTIZATION_CALIBRATION_DIR', 'uploads')
+QUANTIZATION_CALIBRATION_LIMIT = int(os.getenv('QUANTIZATION_CALIBRATION_LIMIT', 32))
+
+# Classifier runtime: 'torch' (eager), 'torchscript', 'onnx' (ONNX Runtime on CPU)
+# or 'remote' (send batches to a shared inference server, see services/inference_server.py)
+INFERENCE_BACKEND = os.getenv('INFERENCE_BACKEND', 'torch')
+TORCHSCRIPT_MODEL_PATH = os.getenv('TORCHSCRIPT_MODEL_PATH', 'Backend/model_weights.torchscript.pt')
+ONNX_MODEL_PATH = os.getenv('ONNX_MODEL_PATH', 'Backend/model_weights.onnx')
+
+# Dedicated inference worker processes shared by all web workers. Connections
+# carry pickled data, so the server and the 'remote' backend refuse to start
+# without INFERENCE_SERVER_AUTHKEY (use a long random secret).
+INFERENCE_SERVER_ADDRESS = os.getenv('INFERENCE_SERVER_ADDRESS', '127.0.0.1:6001')
+INFERENCE_SERVER_AUTHKEY = os.getenv('INFERENCE_SERVER_AUTHKEY', '').encode()
+INFERENCE_SERVER_WORKERS = int(os.getenv('INFERENCE_SERVER_WORKERS', 2))
+INFERENCE_SERVER_BACKEND = os.getenv('INFERENCE_SERVER_BACKEND', 'torch')
+
+# /upload/batch limits
+UPLOAD_BATCH_MAX_IMAGES = int(os.getenv('UPLOAD_BATCH_MAX_IMAGES', 16))
+GEMINI_BATCH_MAX_WORKERS = int(os.getenv('GEMINI_BATCH_MAX_WORKERS', 4))
+# Async job API: worker threads for the Gemini step, jobs allowed to wait,
+# and seconds a finished job's result is kept for polling
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', 4))
+JOB_MAX_QUEUE = int(os.getenv('JOB_MAX_QUEUE', 100))
+JOB_RESULT_TTL_SECONDS = int(os.getenv('JOB_RESULT_TTL_SECONDS', 600))
+JOB_EVENTS_TIMEOUT_SECONDS = int(os.getenv('JOB_EVENTS_TIMEOUT_SECONDS', 120))
+
+# Cache of /upload responses keyed by image content hash and request options
+UPLOAD_CACHE_MAX_ENTRIES = int(os.getenv('UPLOAD_CACHE_MAX_ENTRIES', 1024))
+UPLOAD_CACHE_TTL_SECONDS = int(os.getenv('UPLOAD_CACHE_TTL_SECONDS', 3600))
+
+# Reuse Gemini's recipe for near-duplicates of photos whose predicted class was not
+# trusted (confidently predicted dishes are served from the recipe store instead).
+# Partitions are keyed by the model's top class as well, so a match has to agree
+# with it even though it was not trusted; memory is bounded by entries per
+# (class, servings, allergies) partition times partitions.
+SIMILARITY_INDEX_ENABLED = os.getenv('SIMILARITY_INDEX_ENABLED', 'true').lower() == 'true'
+SIMILARITY_INDEX_PATH = os.getenv('SIMILARITY_INDEX_PATH', 'Backend/similarity_index')
+SIMILARITY_THRESHOLD = float(os.getenv('SIMILARITY_THRESHOLD', 0.95))
+SIMILARITY_INDEX_MAX_ENTRIES_PER_KEY = int(os.getenv('SIMILARITY_INDEX_MAX_ENTRIES_PER_KEY', 64))
+SIMILARITY_INDEX_MAX_PARTITIONS = int(os.getenv('SIMILARITY_INDEX_MAX_PARTITIONS', 128))
+SIMILARITY_INDEX_SAVE_INTERVAL_SECONDS = int(os.getenv('SIMILARITY_INDEX_SAVE_INTERVAL_SECONDS', 30))
+
+# Persistent recipe store keyed on (predicted class, servings, allergies)
+RECIPE_STORE_ENABLED = os.getenv('RECIPE_STORE_ENABLED', 'true').lower() == 'true'
+RECIPE_STORE_PATH = os.getenv('RECIPE_STORE_PATH', 'Backend/recipe_store.sqlite3')
+RECIPE_STORE_TTL_SECONDS = int(os.getenv('RECIPE_STORE_TTL_SECONDS', 7 * 24 * 3600))
+RECIPE_STORE_MAX_ENTRIES = int(os.getenv('RECIPE_STORE_MAX_ENTRIES', 5000))
+# Canonical per-class recipes from scripts/precompute_recipes.py, used when the
+# classifier is at least this confident
+CANONICAL_RECIPE_SERVINGS = int(os.getenv('CANONICAL_RECIPE_SERVINGS', 1))
+CANONICAL_RECIPE_MIN_CONFIDENCE = float(os.getenv('CANONICAL_RECIPE_MIN_CONFIDENCE', 0.5))
+
+GEMINI_API_ENDPOINT = os.getenv(
+    'GEMINI_API_ENDPOINT',
+    f"https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-flash:generateContent?key={GEMINI_API_KEY}"
+)
+GEMINI_STREAM_ENDPOINT = os.getenv(
+    'GEMINI_STREAM_ENDPOINT',
+    f"https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-flash:streamGenerateContent?alt=sse&key={GEMINI_API_KEY}"
+)
+
+# Pooled Gemini HTTP client. GEMINI_POOL_SIZE should cover every thread that can
+# call Gemini at once (request threads plus the batch pool).
+GEMINI_POOL_SIZE = int(os.getenv('GEMINI_POOL_SIZE', 16))
+GEMINI_CONNECT_TIMEOUT = float(os.getenv('GEMINI_CONNECT_TIMEOUT', 5))
+GEMINI_READ_TIMEOUT = float(os.getenv('GEMINI_READ_TIMEOUT', 60))
+GEMINI_MAX_RETRIES = int(os.getenv('GEMINI_MAX_RETRIES', 3))
+GEMINI_BACKOFF_BASE = float(os.getenv('GEMINI_BACKOFF_BASE', 0.5))
+GEMINI_BACKOFF_MAX = float(os.getenv('GEMINI_BACKOFF_MAX', 8))
+
+# Images sent to Gemini are downscaled to this longest edge and re-encoded
+# as JPEG at this quality; 0 disables the preparation step
+GEMINI_IMAGE_MAX_EDGE = int(os.getenv('GEMINI_IMAGE_MAX_EDGE', 1024))
+GEMINI_IMAGE_JPEG_QUALITY = int(os.getenv('GEMINI_IMAGE_JPEG_QUALITY', 85))
+
+# Identical recipe requests in flight at the same time share one Gemini call;
+# followers give up after GEMINI_COALESCE_WAIT_SECONDS
+GEMINI_COALESCE_ENABLED = os.getenv('GEMINI_COALESCE_ENABLED', 'true').lower() == 'true'
+GEMINI_COALESCE_WAIT_SECONDS = float(os.getenv('GEMINI_COALESCE_WAIT_SECONDS', 120))
+
+# Structured output: send a response schema with JSON response mode and a
+# compact prompt instead of describing the JSON shape in prose. Output is
+# capped at GEMINI_MAX_OUTPUT_TOKENS (0 leaves it to the model; the default is
+# uncapped without structured output, whose prose-format recipes run longer).
+# A recipe cut off at the cap is requested once more with
+# GEMINI_MAX_OUTPUT_TOKENS_RETRY (0 disables the retry) before failing.
+GEMINI_STRUCTURED_OUTPUT = os.getenv('GEMINI_STRUCTURED_OUTPUT', 'true').lower() == 'true'
+GEMINI_MAX_OUTPUT_TOKENS = int(os.getenv('GEMINI_MAX_OUTPUT_TOKENS', 1024 if GEMINI_STRUCTURED_OUTPUT else 0))
+GEMINI_MAX_OUTPUT_TOKENS_RETRY = int(os.getenv('GEMINI_MAX_OUTPUT_TOKENS_RETRY', 4096))
+
+# Outbound admission control per external service: calls per second (rate),
+# back-to-back burst, concurrent calls, waiting callers and the default
+# seconds a caller may wait before it is shed. Each value can be overridden
+# with <NAME>_LIMIT_<FIELD>, e.g. GEMINI_LIMIT_RATE=2.
+def _outbound_limits(name, rate, burst, max_in_flight, max_queue, queue_timeout):
+    prefix = f'{name.upper()}_LIMIT'
+    return {
+        'rate': float(os.getenv(f'{prefix}_RATE', rate)),
+        'burst': float(os.getenv(f'{prefix}_BURST', burst)),
+        'max_in_flight': int(os.getenv(f'{prefix}_MAX_IN_FLIGHT', max_in_flight)),
+        'max_queue': int(os.getenv(f'{prefix}_MAX_QUEUE', max_queue)),
+        'queue_timeout': float(os.getenv(f'{prefix}_QUEUE_TIMEOUT', queue_timeout))
+    }
+
+OUTBOUND_LIMITS = {
+    'gemini': _outbound_limits('gemini', rate=5, burst=10, max_in_flight=16, max_queue=64, queue_timeout=10),
+    'translate': _outbound_limits('translate', rate=10, burst=20, max_in_flight=8, max_queue=64, queue_timeout=5),
+    'tts': _outbound_limits('tts', rate=5, burst=10, max_in_flight=4, max_queue=32, queue_timeout=10),
+    'spoonacular': _outbound_limits('spoonacular', rate=2, burst=5, max_in_flight=4, max_queue=32, queue_timeout=5)
+}
+# Consecutive upstream failures (5xx, 429, connection errors) that open a
+# circuit, and seconds before a trial call is let through
+OUTBOUND_BREAKER_FAILURES = int(os.getenv('OUTBOUND_BREAKER_FAILURES', 5))
+OUTBOUND_BREAKER_RESET_SECONDS = float(os.getenv('OUTBOUND_BREAKER_RESET_SECONDS', 30))
+SPOONACULAR_TIMEOUT = float(os.getenv('SPOONACULAR_TIMEOUT', 15))
+
+# Opt-in hedging for Gemini and translation calls: a duplicate request is sent
+# once a call is slower than the rolling HEDGE_PERCENTILE latency (at least
+# HEDGE_MIN_DELAY_MS), for at most HEDGE_BUDGET_PERCENT of calls
+HEDGING_ENABLED = os.getenv('HEDGING_ENABLED', 'false').lower() == 'true'
+HEDGE_PERCENTILE = float(os.getenv('HEDGE_PERCENTILE', 95))
+HEDGE_MIN_DELAY_MS = float(os.getenv('HEDGE_MIN_DELAY_MS', 200))
+HEDGE_MIN_SAMPLES = int(os.getenv('HEDGE_MIN_SAMPLES', 20))
+HEDGE_BUDGET_PERCENT = float(os.getenv('HEDGE_BUDGET_PERCENT', 5))
+HEDGE_MAX_WORKERS = int(os.getenv('HEDGE_MAX_WORKERS', 32))
 
 ALLERGEN_SUBSTITUTES = {
     'peanuts': ['sunflower seeds', 'pumpkin seeds', 'almonds', 'cashews'],
-    'tree nuts': ['seeds', 'coconut', 'sunflower seeds', 'pumpkin seeds'],
+    'tree nuts': ['pumpkin seeds', 'sunflower seeds', 'coconut', 'seeds'],
     'milk': ['almond milk', 'soy milk', 'coconut milk', 'oat milk'],
     'eggs': ['flax seeds mixed with water', 'applesauce', 'mashed banana', 'tofu'],
     'soy': ['chickpeas', 'lentils', 'hemp seeds', 'quinoa'],
@@ -26,4 +183,124 @@ ALLERGEN_SUBSTITUTES = {
     'celery': ['fennel', 'celeriac', 'jicama', 'bok choy'],
     'lupin': ['chickpeas', 'lentils', 'peas', 'beans'],
     'sulphites': ['vinegar', 'lemon juice', 'lime juice', 'citric acid']
-}
\ No newline at end of file
+}
+# Ingredient words that carry each allergen, used to rewrite stored recipes
+# locally instead of asking Gemini for a new one per allergy set
+ALLERGEN_SYNONYMS = {
+    'peanuts': ['peanut', 'groundnut', 'moongphali', 'peanut butter', 'peanut oil', 'groundnut oil'],
+    'tree nuts': ['almond milk', 'cashew milk', 'cashew cream', 'almond', 'badam', 'cashew', 'kaju',
+                  'pistachio', 'pista', 'walnut', 'akhrot', 'chironji', 'hazelnut', 'pecan', 'nuts', 'dry fruits'],
+    'milk': ['milk', 'dairy', 'lactose', 'ghee', 'butter', 'paneer', 'curd', 'dahi', 'yogurt', 'yoghurt',
+             'cream', 'malai', 'khoya', 'khoa', 'mawa', 'cheese', 'buttermilk', 'chaas', 'chhena', 'rabri',
+             'condensed milk'],
+    'eggs': ['egg', 'anda', 'mayonnaise'],
+    'soy': ['soy', 'soya', 'tofu', 'soy sauce', 'edamame', 'soybean oil', 'soya chunk'],
+    'wheat': ['whole wheat flour', 'wheat flour', 'refined flour', 'all-purpose flour', 'wheat', 'atta',
+              'maida', 'sooji', 'suji', 'semolina', 'rava', 'rawa', 'dalia', 'bread', 'pav', 'roti', 'noodle',
+              'vermicelli', 'seviyan'],
+    'gluten': ['whole wheat flour', 'wheat flour', 'refined flour', 'all-purpose flour', 'gluten', 'wheat',
+               'atta', 'maida', 'sooji', 'suji', 'semolina', 'rava', 'rawa', 'dalia', 'bread', 'pav', 'roti',
+               'noodle', 'vermicelli', 'seviyan', 'barley', 'rye', 'hing', 'asafoetida'],
+    'fish': ['fish', 'machli', 'rohu', 'hilsa', 'pomfret', 'surmai', 'bangda', 'mackerel', 'tuna', 'salmon',
+             'sardine', 'anchovy'],
+    'shellfish': ['shellfish', 'prawn', 'shrimp', 'jhinga', 'crab', 'lobster', 'clam', 'mussel', 'oyster', 'squid'],
+    'sesame': ['sesame', 'til', 'gingelly', 'tahini', 'sesame seed', 'til seed', 'sesame oil', 'til oil',
+               'gingelly oil'],
+    'mustard': ['mustard', 'rai', 'sarson', 'kasundi', 'mustard seed', 'rai seed', 'mustard oil', 'sarson oil',
+                'kachi ghani oil'],
+    'celery': ['celery'],
+    'lupin': ['lupin', 'lupine'],
+    'sulphites': ['sulphite', 'sulfite', 'wine', 'dried apricot']
+}
+
+# Ingredient-specific replacements that read better than the generic
+# ALLERGEN_SUBSTITUTES entry for the allergen (e.g. ghee -> oil, not almond milk)
+ALLERGEN_TERM_SUBSTITUTES = {
+    'ghee': ['vegetable oil', 'coconut oil'],
+    'butter': ['vegetable oil', 'coconut oil'],
+    'paneer': ['tofu', 'boiled potatoes'],
+    'curd': ['coconut yogurt', 'lemon juice'],
+    'dahi': ['coconut yogurt', 'lemon juice'],
+    'yogurt': ['coconut yogurt', 'lemon juice'],
+    'yoghurt': ['coconut yogurt', 'lemon juice'],
+    'cream': ['coconut cream', 'cashew cream'],
+    'malai': ['coconut cream', 'cashew cream'],
+    'cheese': ['nutritional yeast', 'tofu'],
+    'almond milk': ['oat milk', 'coconut milk'],
+    'cashew milk': ['oat milk', 'coconut milk'],
+    'cashew cream': ['coconut cream'],
+    'hing': ['gluten-free hing'],
+    'asafoetida': ['gluten-free asafoetida'],
+    'peanut butter': ['sunflower seed butter'],
+    'peanut oil': ['sunflower oil', 'vegetable oil'],
+    'groundnut oil': ['sunflower oil', 'vegetable oil'],
+    'soybean oil': ['sunflower oil', 'vegetable oil'],
+    'soya chunk': ['paneer', 'chickpeas'],
+    'sesame seed': ['poppy seeds', 'sunflower seeds'],
+    'til seed': ['poppy seeds', 'sunflower seeds'],
+    'sesame oil': ['sunflower oil', 'vegetable oil'],
+    'til oil': ['sunflower oil', 'vegetable oil'],
+    'gingelly oil': ['sunflower oil', 'vegetable oil'],
+    'mustard seed': ['cumin seeds'],
+    'rai seed': ['cumin seeds'],
+    'mustard oil': ['sunflower oil', 'vegetable oil'],
+    'sarson oil': ['sunflower oil', 'vegetable oil'],
+    'kachi ghani oil': ['sunflower oil', 'vegetable oil'],
+    'bread': ['gluten-free bread'],
+    'pav': ['gluten-free buns'],
+    'roti': ['jowar roti', 'bajra roti'],
+    'noodle': ['rice noodles'],
+    'vermicelli': ['rice vermicelli'],
+    'seviyan': ['rice vermicelli']
+}
+
+# Words naming the form of an ingredient ('mustard seeds', 'almond flakes'). A
+# substitute replaces the whole phrase, so an allergen term followed by one of
+# these is only rewritten locally when ALLERGEN_FORM_SUBSTITUTES has an entry
+# for the allergen and form; otherwise the recipe is left to Gemini
+ALLERGEN_INGREDIENT_FORMS = ['seed', 'oil', 'paste', 'powder', 'sauce', 'butter', 'leaves', 'leaf', 'greens',
+                             'flour', 'milk', 'cream', 'chunk', 'extract', 'flake', 'sliver', 'halves', 'half',
+                             'piece', 'meal']
+
+# Replacements for a whole '<allergen term> <form>' phrase, by allergen and form
+ALLERGEN_FORM_SUBSTITUTES = {
+    'tree nuts': {
+        'flake': ['pumpkin seeds', 'sunflower seeds'],
+        'sliver': ['pumpkin seeds', 'sunflower seeds'],
+        'halves': ['pumpkin seeds', 'sunflower seeds'],
+        'half': ['pumpkin seeds', 'sunflower seeds'],
+        'piece': ['pumpkin seeds', 'sunflower seeds'],
+        'paste': ['melon seed paste', 'poppy seed paste'],
+        'powder': ['melon seed powder'],
+        'meal': ['sunflower seed meal']
+    },
+    'peanuts': {
+        'halves': ['roasted chana'],
+        'piece': ['roasted chana'],
+        'powder': ['roasted chana powder']
+    },
+    'milk': {
+        'powder': ['coconut milk powder']
+    },
+    'mustard': {
+        'paste': ['ginger paste'],
+        'powder': ['turmeric powder'],
+        'greens': ['spinach'],
+        'leaves': ['spinach'],
+        'leaf': ['spinach']
+    },
+    'sesame': {
+        'paste': ['sunflower seed paste']
+    }
+}
+
+# Phrases that contain an allergen word but do not carry the allergen
+ALLERGEN_EXCEPTIONS = {
+    'milk': ['coconut milk', 'almond milk', 'soy milk', 'oat milk', 'rice milk', 'cashew milk',
+             'coconut cream', 'cashew cream', 'coconut yogurt', 'cocoa butter', 'peanut butter'],
+    'wheat': ['gluten-free bread', 'gluten-free buns', 'jowar roti', 'bajra roti', 'rice noodles',
+              'rice vermicelli'],
+    'gluten': ['gluten-free flour blend', 'gluten-free hing', 'gluten-free asafoetida', 'gluten-free bread',
+               'gluten-free buns', 'jowar roti', 'bajra roti', 'rice noodles', 'rice vermicelli'],
+    'soy': ['soy-free']
+}
@@ -0,0 +1,44 @@
+from flask import Blueprint, jsonify
+from services.model_service import is_model_ready
+from services.cache_service import upload_cache
+from services.similarity_index import similarity_index
+from services.gemini_client import gemini_client
+from services.recipe_store import recipe_store
+from services.outbound_limiter import outbound_limiters
+from services.job_service import job_queue
+from services.translation_service import translate_metrics, translate_hedger
+from services.gemini_service import image_prep_metrics, recipe_flights, recipe_call_metrics
+
+health_bp = Blueprint('health', __name__, url_prefix='/health')
+
+@health_bp.route('/live', methods=['GET'])
+def live():
+    return jsonify({'status': 'ok'})
+
+@health_bp.route('/ready', methods=['GET'])
+def ready():
+    """
+    Report ready only once the model is loaded and warmed up
+    """
+    if not is_model_ready():
+        return jsonify({'status': 'loading', 'model_ready': False}), 503
+
+    return jsonify({'status': 'ready', 'model_ready': True})
+
+@health_bp.route('/metrics', methods=['GET'])
+def metrics():
+    return jsonify({
+        'upload_cache': upload_cache.stats(),
+        'similarity_index': similarity_index.stats(),
+        'recipe_store': recipe_store.stats(),
+        'gemini': gemini_client.stats(),
+        'gemini_recipe_calls': recipe_call_metrics.stats(),
+        'gemini_image_prep': image_prep_metrics.stats(),
+        'gemini_coalescing': recipe_flights.stats(),
+        'translate': {
+            'calls': translate_metrics.stats(),
+            'hedging': translate_hedger.stats() if translate_hedger is not None else None
+        },
+        'outbound': {name: limiter.stats() for name, limiter in outbound_limiters.items()},
+        'jobs': job_queue.stats()
+    })
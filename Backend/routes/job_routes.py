@@ -0,0 +1,137 @@
+import os
+import time
+import logging
+from flask import Blueprint, Response, request, jsonify
+from services.model_service import predict_food_with_embedding, INPUT_SIZE
+from services.recipe_service import resolve_recipe
+from services.cache_service import upload_cache, make_upload_cache_key
+from services.job_service import job_queue, JobQueueFull
+from routes.recipe_routes import (
+    parse_recipe_options, should_use_prediction, build_prediction, build_upload_response, format_sse
+)
+from utils.helpers import save_uploaded_image, open_image
+from config import JOB_EVENTS_TIMEOUT_SECONDS
+
+logger = logging.getLogger(__name__)
+
+job_bp = Blueprint('jobs', __name__, url_prefix='/jobs')
+
+def run_recipe_job(image_data, image_filename, cache_key, predicted_class, confidence, use_prediction,
+                   servings, allergies, embedding):
+    """
+    The Gemini step of an upload, run on a job worker
+
+    Returns:
+        The /upload response for the job
+    """
+    recipe_data = resolve_recipe(
+        image_data,
+        predicted_class,
+        use_prediction,
+        servings,
+        allergies,
+        embedding,
+        confidence
+    )
+    response = build_upload_response(
+        recipe_data, servings, image_filename, predicted_class, confidence, use_prediction
+    )
+    upload_cache.set(cache_key, response)
+    return response
+
+def job_links(job_id):
+    return {'status_url': f'/jobs/{job_id}', 'events_url': f'/jobs/{job_id}/events'}
+
+@job_bp.route('', methods=['POST'])
+def create_job():
+    """
+    Accept a photo like /upload, classify it and queue the recipe generation
+
+    Returns 202 with the job id and model prediction right away; the recipe
+    is fetched from /jobs/<id> (polling) or /jobs/<id>/events (SSE). Cached
+    uploads return 200 with a job that is already done.
+    """
+    try:
+        if 'photo' not in request.files:
+            return jsonify({'error': 'No file part'}), 400
+
+        file = request.files['photo']
+        if file.filename == '':
+            return jsonify({'error': 'No selected file'}), 400
+
+        servings, allergies, force_mode = parse_recipe_options(request.form)
+
+        image_data = file.read()
+        file.seek(0)
+
+        cache_key = make_upload_cache_key(image_data, servings, allergies, force_mode)
+        cached_response = upload_cache.get(cache_key)
+        if cached_response is not None:
+            image_filename = os.path.basename(save_uploaded_image(file))
+            job = job_queue.add_finished(
+                dict(cached_response, image_url=f'/uploads/{image_filename}'),
+                metadata={'model_prediction': cached_response['model_prediction']}
+            )
+            return jsonify(dict(job.to_dict(), **job_links(job.id)))
+
+        image = open_image(image_data, target_size=INPUT_SIZE)
+        image_filename = os.path.basename(save_uploaded_image(file))
+
+        predicted_class, confidence, embedding = predict_food_with_embedding(image)
+        use_prediction = should_use_prediction(predicted_class, confidence, force_mode)
+
+        job = job_queue.submit(
+            run_recipe_job,
+            image_data, image_filename, cache_key, predicted_class, confidence, use_prediction,
+            servings, allergies, embedding,
+            metadata={'model_prediction': build_prediction(predicted_class, confidence, use_prediction)}
+        )
+        return jsonify(dict(job.to_dict(), **job_links(job.id))), 202
+
+    except JobQueueFull as e:
+        logger.warning(f"Rejected job: {str(e)}")
+        return jsonify({'error': str(e)}), 503
+    except Exception as e:
+        logger.error(f"Error creating job: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@job_bp.route('/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown or expired job'}), 404
+    return jsonify(job.to_dict())
+
+@job_bp.route('/<job_id>/events', methods=['GET'])
+def job_events(job_id):
+    """
+    Stream a job's status changes as Server-Sent Events
+
+    Sends a status event for every change and ends with the finished job
+    (a result or error event), or a timeout event after
+    JOB_EVENTS_TIMEOUT_SECONDS.
+    """
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown or expired job'}), 404
+
+    def generate():
+        deadline = time.monotonic() + JOB_EVENTS_TIMEOUT_SECONDS
+        status = job.status
+        yield format_sse('status', {'job_id': job.id, 'status': status})
+        while not job.finished:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                yield format_sse('timeout', {'job_id': job.id, 'status': job.status})
+                return
+            new_status = job.wait_for_change(status, timeout=min(remaining, 15))
+            if new_status == status:
+                yield ': keep-alive\n\n'
+                continue
+            status = new_status
+            if not job.finished:
+                yield format_sse('status', {'job_id': job.id, 'status': status})
+        yield format_sse('result' if job.status == 'done' else 'error', job.to_dict())
+
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
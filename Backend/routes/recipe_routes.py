@@ -1,16 +1,71 @@
 import os
-import io
+import json
 import logging
-from flask import Blueprint, request, jsonify, send_from_directory
-from PIL import Image
-from services.model_service import predict_food_from_image
-from services.gemini_service import get_recipe_from_image
-from utils.helpers import save_uploaded_image
+from concurrent.futures import ThreadPoolExecutor
+from flask import Blueprint, Response, request, jsonify, send_from_directory
+from services.model_service import predict_food_with_embedding, predict_foods_from_images, INPUT_SIZE
+from services.recipe_service import (
+    resolve_recipe, find_local_recipe, remember_recipe, find_similar_recipe, remember_similar_recipe
+)
+from services.gemini_service import stream_recipe_from_image, RecipeTruncatedError
+from services.cache_service import upload_cache, make_upload_cache_key
+from services.outbound_limiter import UpstreamRejected
+from utils.helpers import save_uploaded_image, open_image
+from config import UPLOAD_BATCH_MAX_IMAGES, GEMINI_BATCH_MAX_WORKERS
 
 logger = logging.getLogger(__name__)
 
 recipe_bp = Blueprint('recipe', __name__)
 
+_gemini_pool = ThreadPoolExecutor(max_workers=GEMINI_BATCH_MAX_WORKERS, thread_name_prefix='gemini-batch')
+
+def parse_recipe_options(form):
+    servings = form.get("servings")
+    if not servings or not servings.isdigit():
+        servings = 1
+    servings = int(servings)
+    
+    allergies = form.get("allergies")
+    if allergies:
+        allergies = [allergen.strip() for allergen in allergies.split(',')]
+    else:
+        allergies = []
+
+    force_mode = form.get("force_mode", "auto")
+    return servings, allergies, force_mode
+
+def should_use_prediction(predicted_class, confidence, force_mode):
+    if force_mode == "model":
+        return predicted_class is not None
+    elif force_mode == "gemini":
+        return False
+    else: 
+        return predicted_class is not None and confidence >= 0.5
+
+def build_prediction(predicted_class, confidence, use_prediction):
+    return {
+        'class': predicted_class,
+        'confidence': round(confidence * 100, 2),
+        'used_for_recipe': use_prediction
+    } if predicted_class else None
+
+def build_upload_response(recipe_data, servings, image_filename, predicted_class, confidence, use_prediction):
+    return {
+        'message': 'Success',
+        'dish_name': recipe_data.get("name"),
+        'description': recipe_data.get("description"),
+        'ingredients': recipe_data.get("ingredients"),
+        'instructions': recipe_data.get("instructions"),
+        'prepTime': recipe_data.get("prepTime"),
+        'cookTime': recipe_data.get("cookTime"),
+        'servings': servings,  
+        'ytLink': recipe_data.get("ytLink"),
+        'image_url': f'/uploads/{image_filename}',
+        'model_prediction': build_prediction(predicted_class, confidence, use_prediction),
+        'identification_source': recipe_data.get("identification_source", "unknown"),
+        'allergen_free': recipe_data.get("allergen_free", [])
+    }
+
 @recipe_bp.route('/upload', methods=['POST'])
 def upload():
     try:
@@ -21,67 +76,218 @@ def upload():
         if file.filename == '':
             return jsonify({'error': 'No selected file'}), 400
 
-        servings = request.form.get("servings")
-        if not servings or not servings.isdigit():
-            servings = 1
-        servings = int(servings)
-        
-        allergies = request.form.get("allergies")
-        if allergies:
-            allergies = [allergen.strip() for allergen in allergies.split(',')]
-        else:
-            allergies = []
-
-        force_mode = request.form.get("force_mode", "auto")
+        servings, allergies, force_mode = parse_recipe_options(request.form)
 
         image_data = file.read()
         file.seek(0)
-        image = Image.open(io.BytesIO(image_data))
-        image.load()
+
+        cache_key = make_upload_cache_key(image_data, servings, allergies, force_mode)
+        cached_response = upload_cache.get(cache_key)
+        if cached_response is not None:
+            image_filename = os.path.basename(save_uploaded_image(file))
+            return jsonify(dict(cached_response, image_url=f'/uploads/{image_filename}'))
+
+        image = open_image(image_data, target_size=INPUT_SIZE)
     
         image_filepath = save_uploaded_image(file)
         image_filename = os.path.basename(image_filepath)
 
-        predicted_class, confidence = predict_food_from_image(image)
-        
-        if force_mode == "model":
-            use_prediction = predicted_class is not None
-        elif force_mode == "gemini":
-            use_prediction = False
-        else: 
-            use_prediction = predicted_class is not None and confidence >= 0.5
+        predicted_class, confidence, embedding = predict_food_with_embedding(image)
+        use_prediction = should_use_prediction(predicted_class, confidence, force_mode)
         
-        recipe_data = get_recipe_from_image(
-            image_data, 
-            predicted_class if use_prediction else None, 
+        recipe_data = resolve_recipe(
+            image_data,
+            predicted_class,
+            use_prediction,
             servings,
-            allergies
+            allergies,
+            embedding,
+            confidence
         )
 
-        return jsonify({
-            'message': 'Success',
-            'dish_name': recipe_data.get("name"),
-            'description': recipe_data.get("description"),
-            'ingredients': recipe_data.get("ingredients"),
-            'instructions': recipe_data.get("instructions"),
-            'prepTime': recipe_data.get("prepTime"),
-            'cookTime': recipe_data.get("cookTime"),
-            'servings': servings,  
-            'ytLink': recipe_data.get("ytLink"),
-            'image_url': f'/uploads/{image_filename}',
-            'model_prediction': {
-                'class': predicted_class,
-                'confidence': round(confidence * 100, 2),
-                'used_for_recipe': use_prediction
-            } if predicted_class else None,
-            'identification_source': recipe_data.get("identification_source", "unknown"),
-            'allergen_free': recipe_data.get("allergen_free", [])
-        })
+        response = build_upload_response(
+            recipe_data, servings, image_filename, predicted_class, confidence, use_prediction
+        )
+        upload_cache.set(cache_key, response)
+        return jsonify(response)
 
+    except UpstreamRejected as e:
+        logger.warning(f"Rejected upload: {str(e)}")
+        return jsonify({'error': str(e)}), 503
+    except RecipeTruncatedError as e:
+        return jsonify({'error': str(e)}), 502
     except Exception as e:
         logger.error(f"Error processing upload: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+def format_sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@recipe_bp.route('/upload/stream', methods=['POST'])
+def upload_stream():
+    """
+    Decode a photo like /upload, streaming the result as Server-Sent Events
+
+    Events, in order:
+        prediction: model prediction and image_url, as soon as the classifier is done
+        item: {field, index, value} for each ingredient and instruction as soon as it is complete
+        field: {field, value} for each complete top-level recipe field
+        recipe: the full /upload response
+        error: {error} if generation fails after the stream started
+    Recipes served from a cache or the recipe store arrive as a single recipe event.
+    """
+    try:
+        if 'photo' not in request.files:
+            return jsonify({'error': 'No file part'}), 400
+
+        file = request.files['photo']
+        if file.filename == '':
+            return jsonify({'error': 'No selected file'}), 400
+
+        servings, allergies, force_mode = parse_recipe_options(request.form)
+
+        image_data = file.read()
+        file.seek(0)
+
+        cache_key = make_upload_cache_key(image_data, servings, allergies, force_mode)
+        cached_response = upload_cache.get(cache_key)
+        if cached_response is None:
+            image = open_image(image_data, target_size=INPUT_SIZE)
+        image_filename = os.path.basename(save_uploaded_image(file))
+        image_url = f'/uploads/{image_filename}'
+
+        if cached_response is None:
+            predicted_class, confidence, embedding = predict_food_with_embedding(image)
+            use_prediction = should_use_prediction(predicted_class, confidence, force_mode)
+            prediction = build_prediction(predicted_class, confidence, use_prediction)
+        else:
+            prediction = cached_response['model_prediction']
+
+    except Exception as e:
+        logger.error(f"Error processing upload: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+    def generate():
+        yield format_sse('prediction', {'model_prediction': prediction, 'image_url': image_url, 'servings': servings})
+        if cached_response is not None:
+            yield format_sse('recipe', dict(cached_response, image_url=image_url))
+            return
+
+        try:
+            if use_prediction:
+                recipe_data = find_local_recipe(predicted_class, servings, allergies, confidence)
+            else:
+                recipe_data = find_similar_recipe(embedding, predicted_class, servings, allergies)
+
+            if recipe_data is None:
+                events = stream_recipe_from_image(
+                    None if use_prediction else image_data,
+                    predicted_class if use_prediction else None,
+                    servings,
+                    allergies
+                )
+                for event in events:
+                    if event[0] == 'item':
+                        yield format_sse('item', {'field': event[1], 'index': event[2], 'value': event[3]})
+                    elif event[0] == 'field':
+                        yield format_sse('field', {'field': event[1], 'value': event[2]})
+                    else:
+                        recipe_data = event[1]
+                if use_prediction:
+                    remember_recipe(predicted_class, servings, allergies, recipe_data)
+                else:
+                    remember_similar_recipe(embedding, predicted_class, servings, allergies, recipe_data)
+
+            response = build_upload_response(
+                recipe_data, servings, image_filename, predicted_class, confidence, use_prediction
+            )
+            upload_cache.set(cache_key, response)
+            yield format_sse('recipe', response)
+
+        except Exception as e:
+            logger.error(f"Error streaming upload: {str(e)}")
+            yield format_sse('error', {'error': str(e)})
+
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@recipe_bp.route('/upload/batch', methods=['POST'])
+def upload_batch():
+    """
+    Decode several photos in one request
+
+    All photos are classified as one batch, then the Gemini recipe calls run
+    concurrently on a bounded pool. Each entry of 'results' has the same shape
+    as the /upload response, or an 'error' key if that photo failed.
+    """
+    try:
+        files = [file for file in request.files.getlist('photos') if file.filename]
+        if not files:
+            return jsonify({'error': 'No files provided'}), 400
+        if len(files) > UPLOAD_BATCH_MAX_IMAGES:
+            return jsonify({'error': f'At most {UPLOAD_BATCH_MAX_IMAGES} photos per batch'}), 400
+
+        servings, allergies, force_mode = parse_recipe_options(request.form)
+
+        items = []
+        for file in files:
+            item = {'filename': file.filename}
+            try:
+                item['image_data'] = file.read()
+                file.seek(0)
+                item['cache_key'] = make_upload_cache_key(item['image_data'], servings, allergies, force_mode)
+                item['cached'] = upload_cache.get(item['cache_key'])
+                if item['cached'] is None:
+                    item['image'] = open_image(item['image_data'], target_size=INPUT_SIZE)
+                item['image_filename'] = os.path.basename(save_uploaded_image(file))
+            except Exception as e:
+                logger.error(f"Error reading {file.filename}: {str(e)}")
+                item['error'] = str(e)
+            items.append(item)
+
+        decoded = [item for item in items if 'error' not in item and item['cached'] is None]
+        predictions = predict_foods_from_images([item['image'] for item in decoded])
+
+        for item, (predicted_class, confidence, embedding) in zip(decoded, predictions):
+            use_prediction = should_use_prediction(predicted_class, confidence, force_mode)
+            item['prediction'] = (predicted_class, confidence, use_prediction)
+            item['future'] = _gemini_pool.submit(
+                resolve_recipe,
+                item['image_data'],
+                predicted_class,
+                use_prediction,
+                servings,
+                allergies,
+                embedding,
+                confidence
+            )
+
+        results = []
+        for item in items:
+            if 'error' in item:
+                results.append({'filename': item['filename'], 'error': item['error']})
+                continue
+            if item['cached'] is not None:
+                results.append(dict(item['cached'], image_url=f"/uploads/{item['image_filename']}"))
+                continue
+            try:
+                predicted_class, confidence, use_prediction = item['prediction']
+                recipe_data = item['future'].result()
+                response = build_upload_response(
+                    recipe_data, servings, item['image_filename'], predicted_class, confidence, use_prediction
+                )
+                upload_cache.set(item['cache_key'], response)
+                results.append(response)
+            except Exception as e:
+                logger.error(f"Error processing {item['filename']} in batch: {str(e)}")
+                results.append({'filename': item['filename'], 'error': str(e)})
+
+        return jsonify({'message': 'Success', 'results': results})
+
+    except Exception as e:
+        logger.error(f"Error processing batch upload: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
 @recipe_bp.route('/uploads/<filename>')
 def serve_image(filename):
     return send_from_directory('uploads', filename)
\ No newline at end of file
@@ -2,6 +2,8 @@ from flask import Blueprint, request, jsonify
 import requests
 import os
 from dotenv import load_dotenv
+from config import SPOONACULAR_TIMEOUT
+from services.outbound_limiter import get_limiter, UpstreamRejected
 
 load_dotenv()
 
@@ -9,6 +11,16 @@ SPOONACULAR_API_KEY = os.getenv('SPOONACULAR_API_KEY')
 
 spoonacular_bp = Blueprint('spoonacular', __name__, url_prefix='/api/recipes')
 
+def spoonacular_get(url, params):
+    """
+    GET from Spoonacular through the outbound limiter
+    """
+    with get_limiter('spoonacular').slot() as slot:
+        response = requests.get(url, params=params, timeout=SPOONACULAR_TIMEOUT)
+        if response.status_code >= 500 or response.status_code == 429:
+            slot.fail()
+        return response
+
 @spoonacular_bp.route('/indian', methods=['GET'])
 def get_indian_recipes():
     try:
@@ -28,7 +40,7 @@ def get_indian_recipes():
         if query:
             params['query'] = query
         
-        response = requests.get(
+        response = spoonacular_get(
             'https://api.spoonacular.com/recipes/complexSearch',
             params=params
         )
@@ -38,13 +50,15 @@ def get_indian_recipes():
         
         return jsonify(response.json())
     
+    except UpstreamRejected as e:
+        return jsonify({'error': str(e)}), 503
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @spoonacular_bp.route('/<int:recipe_id>', methods=['GET'])
 def get_recipe_details(recipe_id):
     try:
-        response = requests.get(
+        response = spoonacular_get(
             f'https://api.spoonacular.com/recipes/{recipe_id}/information',
             params={
                 'apiKey': SPOONACULAR_API_KEY,
@@ -57,5 +71,7 @@ def get_recipe_details(recipe_id):
         
         return jsonify(response.json())
     
+    except UpstreamRejected as e:
+        return jsonify({'error': str(e)}), 503
     except Exception as e:
         return jsonify({'error': str(e)}), 500
\ No newline at end of file
@@ -1,6 +1,7 @@
 import logging
 from flask import Blueprint, request, jsonify, Response
 from services.translation_service import get_indian_languages, translate_text, text_to_speech
+from services.outbound_limiter import UpstreamRejected
 from utils.helpers import create_audio_data_uri
 
 logger = logging.getLogger(__name__)
@@ -45,6 +46,9 @@ def text_to_speech_stream():
             
         return Response(generate(), mimetype="audio/mpeg")
         
+    except UpstreamRejected as e:
+        logger.warning(f"Rejected TTS stream: {str(e)}")
+        return jsonify({'error': str(e)}), 503
     except Exception as e:
         logger.error(f"Error streaming TTS: {str(e)}")
         return jsonify({'error': str(e)}), 500
@@ -70,6 +74,9 @@ def text_to_speech_selected():
             'translated_text': translated_text
         })
         
+    except UpstreamRejected as e:
+        logger.warning(f"Rejected text-to-speech: {str(e)}")
+        return jsonify({'error': str(e)}), 503
     except Exception as e:
         logger.error(f"Error in text-to-speech: {str(e)}")
         return jsonify({'error': str(e)}), 500
\ No newline at end of file
@@ -0,0 +1,23 @@
+import math
+
+def percentile(values, q):
+    """
+    Nearest-rank percentile of a list of numbers (q in 0-100)
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(q / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+def summarize_latencies(latencies_ms):
+    """
+    Summarize per-call latencies in milliseconds
+    """
+    return {
+        'count': len(latencies_ms),
+        'mean_ms': round(sum(latencies_ms) / len(latencies_ms), 3) if latencies_ms else 0.0,
+        'p50_ms': round(percentile(latencies_ms, 50), 3),
+        'p95_ms': round(percentile(latencies_ms, 95), 3),
+        'p99_ms': round(percentile(latencies_ms, 99), 3)
+    }
@@ -0,0 +1,131 @@
+"""
+Benchmark the classifier path of model_service stage by stage
+
+Builds CustomEfficientNet with random weights (no checkpoint or network
+needed) and times decode (open_image), preprocessing (transform), the forward
+pass and postprocessing (softmax, top-1 and label lookup) separately for every
+combination of batch size and thread count. The JSON report is meant to be
+saved per release and diffed.
+
+Usage (from the Backend directory):
+    python -m scripts.benchmark_classifier --batch-sizes 1 4 8 --threads 1 2 4 --output bench.json
+"""
+import io
+import argparse
+import json
+import time
+import platform
+import torch
+from PIL import Image
+from config import INFERENCE_CHANNELS_LAST, INFERENCE_BF16_AUTOCAST
+from services.model_service import CustomEfficientNet, ClassifierWithEmbedding, INPUT_SIZE, transform, load_class_labels
+from services.inference_backends import create_backend
+from services.runtime_service import describe_topology
+from utils.helpers import open_image
+from scripts.bench_utils import summarize_latencies
+
+def synthetic_jpeg(size=(4032, 3024)):
+    """
+    A phone-sized JPEG so decode and resize costs are realistic
+    """
+    gradient = Image.linear_gradient('L').resize(size)
+    noise = Image.effect_noise(size, 24).convert('L')
+    image = Image.merge('RGB', [gradient, Image.radial_gradient('L').resize(size), Image.blend(gradient, noise, 0.5)])
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=90)
+    return buffer.getvalue()
+
+def time_call(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, (time.perf_counter() - start) * 1000
+
+def postprocess(logits, class_labels):
+    probabilities = torch.nn.functional.softmax(logits, dim=1)
+    max_probs, predicted = torch.max(probabilities, 1)
+    return [(class_labels[index], prob) for index, prob in zip(predicted.tolist(), max_probs.tolist())]
+
+def benchmark_stages(backend, image_data, class_labels, batch_size, iterations, warmup):
+    stages = {'decode': [], 'preprocess': [], 'forward': [], 'postprocess': []}
+
+    with torch.inference_mode():
+        for iteration in range(warmup + iterations):
+            decode_ms = preprocess_ms = 0.0
+            tensors = []
+            for _ in range(batch_size):
+                image, elapsed = time_call(open_image, image_data, INPUT_SIZE)
+                decode_ms += elapsed
+                tensor, elapsed = time_call(transform, image.convert('RGB'))
+                preprocess_ms += elapsed
+                tensors.append(tensor)
+
+            (logits, _), forward_ms = time_call(backend, torch.stack(tensors))
+            _, postprocess_ms = time_call(postprocess, logits, class_labels)
+
+            if iteration >= warmup:
+                stages['decode'].append(decode_ms)
+                stages['preprocess'].append(preprocess_ms)
+                stages['forward'].append(forward_ms)
+                stages['postprocess'].append(postprocess_ms)
+
+    totals = [sum(parts) for parts in zip(*stages.values())]
+    result = {stage: summarize_latencies(latencies) for stage, latencies in stages.items()}
+    result['total'] = summarize_latencies(totals)
+    result['images_per_sec'] = round(batch_size * len(totals) / (sum(totals) / 1000), 2)
+    result['forward_images_per_sec'] = round(batch_size * len(totals) / (sum(stages['forward']) / 1000), 2)
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--batch-sizes', nargs='+', type=int, default=[1, 4, 8])
+    parser.add_argument('--threads', nargs='+', type=int, default=[torch.get_num_threads()])
+    parser.add_argument('--iterations', type=int, default=30)
+    parser.add_argument('--warmup', type=int, default=3)
+    parser.add_argument('--image', help='Image file to use instead of a synthetic 12 MP JPEG')
+    parser.add_argument('--output', help='Write the JSON report to this file instead of stdout')
+    args = parser.parse_args()
+
+    if args.image:
+        with open(args.image, 'rb') as f:
+            image_data = f.read()
+    else:
+        image_data = synthetic_jpeg()
+
+    device = torch.device('cpu')
+    class_labels = load_class_labels()
+    backend = create_backend(
+        'torch', device,
+        model=ClassifierWithEmbedding(CustomEfficientNet(pretrained=False)).eval(),
+        channels_last=INFERENCE_CHANNELS_LAST,
+        bf16_autocast=INFERENCE_BF16_AUTOCAST
+    )
+
+    results = []
+    for threads in args.threads:
+        torch.set_num_threads(threads)
+        for batch_size in args.batch_sizes:
+            result = benchmark_stages(backend, image_data, class_labels, batch_size, args.iterations, args.warmup)
+            results.append(dict({'threads': threads, 'batch_size': batch_size}, **result))
+
+    report = {
+        'environment': {
+            'python': platform.python_version(),
+            'torch': torch.__version__,
+            'platform': platform.platform(),
+            'topology': describe_topology(),
+            'channels_last': INFERENCE_CHANNELS_LAST,
+            'bf16_autocast': backend.bf16_autocast,
+            'image_bytes': len(image_data)
+        },
+        'results': results
+    }
+    output = json.dumps(report, indent=2)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    else:
+        print(output)
+
+if __name__ == '__main__':
+    main()
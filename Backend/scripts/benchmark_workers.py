@@ -0,0 +1,93 @@
+"""
+Measure classifier throughput and tail latency for worker x thread splits
+
+Each split runs W processes with T intra-op threads each, all classifying at
+the same time, the way W WSGI workers on one box would. The model uses random
+weights, so no checkpoint or network access is needed.
+
+Usage (from the Backend directory):
+    python -m scripts.benchmark_workers --splits 1x8 2x4 4x2 8x1 --duration 20
+"""
+import argparse
+import json
+import time
+import multiprocessing
+import torch
+from scripts.bench_utils import summarize_latencies
+
+def parse_split(split):
+    workers, threads = split.lower().split('x')
+    return int(workers), int(threads)
+
+def _worker(threads, batch_size, duration, barrier, results):
+    from services.model_service import CustomEfficientNet, INPUT_SIZE
+    from services.runtime_service import configure_torch_runtime
+
+    configure_torch_runtime(num_threads=threads, interop_threads=1)
+    model = CustomEfficientNet(pretrained=False).eval()
+    batch = torch.randn(batch_size, 3, INPUT_SIZE, INPUT_SIZE)
+
+    latencies_ms = []
+    with torch.inference_mode():
+        for _ in range(3):
+            model(batch)
+
+        barrier.wait()
+        deadline = time.perf_counter() + duration
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            model(batch)
+            latencies_ms.append((time.perf_counter() - start) * 1000)
+
+    results.put(latencies_ms)
+
+def run_split(workers, threads, batch_size, duration):
+    context = multiprocessing.get_context('spawn')
+    barrier = context.Barrier(workers)
+    results = context.Queue()
+    processes = [
+        context.Process(target=_worker, args=(threads, batch_size, duration, barrier, results))
+        for _ in range(workers)
+    ]
+    for process in processes:
+        process.start()
+
+    latencies_ms = []
+    for _ in processes:
+        latencies_ms.extend(results.get())
+    for process in processes:
+        process.join()
+
+    images = len(latencies_ms) * batch_size
+    return {
+        'split': f'{workers}x{threads}',
+        'workers': workers,
+        'threads_per_worker': threads,
+        'batch_size': batch_size,
+        'images_per_sec': round(images / duration, 2),
+        'latency': summarize_latencies(latencies_ms)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--splits', nargs='+', default=['1x4', '2x2', '4x1'], help='WORKERSxTHREADS splits to run')
+    parser.add_argument('--batch-size', type=int, default=1)
+    parser.add_argument('--duration', type=float, default=10.0, help='Seconds to run each split')
+    parser.add_argument('--output', help='Write the JSON report to this file instead of stdout')
+    args = parser.parse_args()
+
+    report = {
+        'torch_version': torch.__version__,
+        'host_cpus': multiprocessing.cpu_count(),
+        'results': [run_split(*parse_split(split), args.batch_size, args.duration) for split in args.splits]
+    }
+    output = json.dumps(report, indent=2)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    else:
+        print(output)
+
+if __name__ == '__main__':
+    main()
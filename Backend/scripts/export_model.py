@@ -0,0 +1,68 @@
+"""
+Export CustomEfficientNet with its trained weights to TorchScript and ONNX
+
+The exported files are what the 'torchscript' and 'onnx' values of
+INFERENCE_BACKEND load, so inference workers using them never import timm.
+Both graphs return (logits, embedding).
+
+ONNX export needs the optional onnx package (pip install -r requirements-onnx.txt).
+
+Usage (from the Backend directory):
+    python -m scripts.export_model --format torchscript onnx
+"""
+import argparse
+import logging
+import torch
+from config import MODEL_WEIGHTS_PATH, TORCHSCRIPT_MODEL_PATH, ONNX_MODEL_PATH
+from services.model_service import load_model, ClassifierWithEmbedding, INPUT_SIZE
+
+logger = logging.getLogger(__name__)
+
+def export_torchscript(model, path):
+    example = torch.zeros(1, 3, INPUT_SIZE, INPUT_SIZE)
+    with torch.no_grad():
+        traced = torch.jit.trace(model, example)
+    traced.save(path)
+    logger.info(f"Saved TorchScript model to {path}")
+
+def export_onnx(model, path, opset_version=17):
+    # torch.onnx.export needs the onnx package to serialize the graph
+    try:
+        import onnx
+    except ImportError:
+        raise ImportError(
+            "ONNX export needs the onnx package, an optional dependency; "
+            "install it with 'pip install -r requirements-onnx.txt'"
+        ) from None
+
+    example = torch.zeros(1, 3, INPUT_SIZE, INPUT_SIZE)
+    torch.onnx.export(
+        model,
+        (example,),
+        path,
+        input_names=['input'],
+        output_names=['logits', 'embedding'],
+        dynamic_axes={'input': {0: 'batch'}, 'logits': {0: 'batch'}, 'embedding': {0: 'batch'}},
+        opset_version=opset_version,
+        dynamo=False
+    )
+    logger.info(f"Saved ONNX model to {path}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--format', nargs='+', choices=['torchscript', 'onnx'], default=['torchscript', 'onnx'])
+    parser.add_argument('--weights', default=MODEL_WEIGHTS_PATH)
+    parser.add_argument('--torchscript-path', default=TORCHSCRIPT_MODEL_PATH)
+    parser.add_argument('--onnx-path', default=ONNX_MODEL_PATH)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    model = ClassifierWithEmbedding(load_model(args.weights)).to('cpu').eval()
+
+    if 'torchscript' in args.format:
+        export_torchscript(model, args.torchscript_path)
+    if 'onnx' in args.format:
+        export_onnx(model, args.onnx_path)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+"""
+Precompute a canonical recipe for every dish the classifier knows
+
+Walks load_class_labels() and asks Gemini (text only, through the shared
+pooled client) for one recipe per class at CANONICAL_RECIPE_SERVINGS with no
+allergies. Results go into the canonical_recipes table of the recipe store,
+which /upload consults first whenever the classifier is confident.
+
+Requests run on a bounded thread pool and are spaced to at most --rate
+requests per second. Every recipe is committed as soon as it arrives, so an
+interrupted or partially failed run is resumed by simply running it again:
+classes already in the store are skipped unless --force is given. The
+script refuses to run when RECIPE_STORE_ENABLED is false, since the store is
+then in memory only and every recipe would be discarded on exit.
+
+Usage (from the Backend directory):
+    python -m scripts.precompute_recipes --concurrency 4 --rate 1
+    python -m scripts.precompute_recipes --endpoint http://127.0.0.1:8089/generate --classes dosa idli
+"""
+import argparse
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from config import CANONICAL_RECIPE_SERVINGS, RECIPE_STORE_ENABLED
+from services.gemini_client import gemini_client
+from services.gemini_service import get_recipe_for_class
+from services.model_service import load_class_labels
+from services.recipe_store import recipe_store
+
+logger = logging.getLogger(__name__)
+
+class RateLimiter:
+    """
+    Spaces calls at least 1 / rate seconds apart across all threads
+
+    Args:
+        rate: Maximum calls per second; 0 or less disables the limit
+    """
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            start_at = max(now, self._next_at)
+            self._next_at = start_at + self.interval
+        if start_at > now:
+            time.sleep(start_at - now)
+
+def precompute_class(predicted_class, servings, limiter, attempts):
+    """
+    Generate and store the canonical recipe for one class
+
+    Returns:
+        None on success, otherwise the error message of the last attempt
+    """
+    error = None
+    for attempt in range(attempts):
+        limiter.wait()
+        try:
+            recipe_data = get_recipe_for_class(predicted_class, servings, [])
+            recipe_store.put_canonical(predicted_class, servings, recipe_data)
+            return None
+        except Exception as e:
+            error = str(e)
+            logger.warning(f"Attempt {attempt + 1}/{attempts} for {predicted_class} failed: {error}")
+    return error
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--concurrency', type=int, default=4, help='Maximum Gemini requests in flight')
+    parser.add_argument('--rate', type=float, default=1.0, help='Maximum Gemini requests started per second')
+    parser.add_argument('--attempts', type=int, default=2, help='Attempts per class (each already retries transient errors)')
+    parser.add_argument('--servings', type=int, default=CANONICAL_RECIPE_SERVINGS)
+    parser.add_argument('--classes', nargs='+', help='Only these classes instead of all labels')
+    parser.add_argument('--endpoint', help='generateContent URL to call instead of the configured one, e.g. a local stub')
+    parser.add_argument('--force', action='store_true', help='Regenerate classes that are already stored')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    if not RECIPE_STORE_ENABLED:
+        logger.error("RECIPE_STORE_ENABLED is false, so the recipe store is in memory only and nothing "
+                     "would be kept; enable it (and set RECIPE_STORE_PATH) to precompute recipes")
+        raise SystemExit(2)
+    if args.endpoint:
+        gemini_client.endpoint = args.endpoint
+
+    classes = args.classes or load_class_labels()
+    done = set() if args.force else recipe_store.canonical_classes()
+    pending = [name for name in classes if name.lower() not in done]
+    logger.info(f"{len(classes) - len(pending)} of {len(classes)} classes already stored; generating {len(pending)}")
+
+    limiter = RateLimiter(args.rate)
+    failures = {}
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, args.concurrency)) as executor:
+        futures = {
+            executor.submit(precompute_class, name, args.servings, limiter, max(1, args.attempts)): name
+            for name in pending
+        }
+        for completed, future in enumerate(as_completed(futures), 1):
+            name = futures[future]
+            error = future.result()
+            if error:
+                failures[name] = error
+            logger.info(f"[{completed}/{len(pending)}] {name}: {'failed' if error else 'stored'}")
+
+    summary = {
+        'classes': len(classes),
+        'skipped': len(classes) - len(pending),
+        'generated': len(pending) - len(failures),
+        'failed': failures,
+        'elapsed_seconds': round(time.perf_counter() - start, 2),
+        'store': recipe_store.path
+    }
+    print(json.dumps(summary, indent=2))
+    if failures:
+        logger.error(f"{len(failures)} classes failed; run again to retry them")
+        raise SystemExit(1)
+
+if __name__ == '__main__':
+    main()
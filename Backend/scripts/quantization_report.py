@@ -0,0 +1,111 @@
+"""
+Compare an INT8 quantized classifier against the fp32 model
+
+Reports top-1 agreement over a directory of sample images, broken down by the
+fp32 predicted class, plus the per-image latency of both models.
+
+Usage (from the Backend directory):
+    python -m scripts.quantization_report --mode static --images uploads
+"""
+import argparse
+import copy
+import json
+import statistics
+from collections import Counter
+import time
+import torch
+from config import MODEL_WEIGHTS_PATH, QUANTIZATION_CALIBRATION_DIR, QUANTIZATION_CALIBRATION_LIMIT
+from services.model_service import load_model, load_class_labels, transform
+from services.quantization_service import quantize_model, load_calibration_tensors
+
+def predict_top1(model, tensors):
+    predictions = []
+    latencies_ms = []
+    with torch.no_grad():
+        model(tensors[0].unsqueeze(0))
+        for tensor in tensors:
+            start = time.perf_counter()
+            outputs = model(tensor.unsqueeze(0))
+            latencies_ms.append((time.perf_counter() - start) * 1000)
+            predictions.append(int(outputs.argmax(dim=1).item()))
+    return predictions, latencies_ms
+
+def summarize_latency(latencies_ms):
+    ordered = sorted(latencies_ms)
+    return {
+        'mean_ms': round(statistics.fmean(ordered), 3),
+        'p50_ms': round(ordered[len(ordered) // 2], 3),
+        'p95_ms': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 3)
+    }
+
+def build_report(mode, weights_path, images_dir, calibration_dir, limit):
+    torch.set_grad_enabled(False)
+    class_labels = load_class_labels()
+
+    fp32_model = load_model(weights_path).to('cpu').eval()
+    eval_tensors = load_calibration_tensors(images_dir, transform, limit)
+    if not eval_tensors:
+        raise ValueError(f"No evaluation images found in '{images_dir}'")
+
+    calibration_tensors = None
+    if mode == 'static':
+        calibration_tensors = load_calibration_tensors(calibration_dir, transform, QUANTIZATION_CALIBRATION_LIMIT)
+    int8_model = quantize_model(copy.deepcopy(fp32_model), mode, calibration_tensors)
+
+    fp32_predictions, fp32_latencies = predict_top1(fp32_model, eval_tensors)
+    int8_predictions, int8_latencies = predict_top1(int8_model, eval_tensors)
+
+    per_class = {}
+    for fp32_index, int8_index in zip(fp32_predictions, int8_predictions):
+        entry = per_class.setdefault(class_labels[fp32_index], {'images': 0, 'agree': 0})
+        entry['images'] += 1
+        entry['agree'] += int(fp32_index == int8_index)
+
+    agreements = sum(entry['agree'] for entry in per_class.values())
+    disagreements = Counter(
+        (class_labels[a], class_labels[b]) for a, b in zip(fp32_predictions, int8_predictions) if a != b
+    )
+    fp32_latency = summarize_latency(fp32_latencies)
+    int8_latency = summarize_latency(int8_latencies)
+
+    return {
+        'mode': mode,
+        'images': len(eval_tensors),
+        'num_classes': len(class_labels),
+        'classes_covered': len(per_class),
+        'top1_agreement': round(agreements / len(eval_tensors), 4),
+        'per_class_agreement': {
+            label: round(entry['agree'] / entry['images'], 4) for label, entry in sorted(per_class.items())
+        },
+        'disagreements': [
+            {'fp32': fp32_label, 'int8': int8_label, 'count': count}
+            for (fp32_label, int8_label), count in disagreements.most_common()
+        ],
+        'latency': {
+            'fp32': fp32_latency,
+            'int8': int8_latency,
+            'speedup': round(fp32_latency['mean_ms'] / int8_latency['mean_ms'], 3)
+        }
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mode', choices=['dynamic', 'static'], default='static')
+    parser.add_argument('--weights', default=MODEL_WEIGHTS_PATH)
+    parser.add_argument('--images', default='uploads', help='Directory of evaluation images')
+    parser.add_argument('--calibration-dir', default=QUANTIZATION_CALIBRATION_DIR)
+    parser.add_argument('--limit', type=int, default=500, help='Maximum number of evaluation images')
+    parser.add_argument('--output', help='Write the JSON report to this file instead of stdout')
+    args = parser.parse_args()
+
+    report = build_report(args.mode, args.weights, args.images, args.calibration_dir, args.limit)
+    output = json.dumps(report, indent=2)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    else:
+        print(output)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,252 @@
+import re
+import copy
+import logging
+from functools import lru_cache
+from config import (
+    ALLERGEN_SUBSTITUTES, ALLERGEN_SYNONYMS, ALLERGEN_TERM_SUBSTITUTES, ALLERGEN_EXCEPTIONS, ALLERGEN_INGREDIENT_FORMS,
+    ALLERGEN_FORM_SUBSTITUTES
+)
+from utils.helpers import normalize_allergies
+
+logger = logging.getLogger(__name__)
+
+def _alternation(words):
+    return '|'.join(re.escape(word) for word in sorted(words, key=len, reverse=True))
+
+def compile_matcher(terms, exceptions=None):
+    """
+    Build one regex matching any allergen term (with plural forms) as a whole word
+
+    Exception phrases such as 'coconut milk' are matched first, so the term
+    they contain is consumed without being reported.
+    """
+    safe = _alternation(exceptions) if exceptions else r'(?!x)x'
+    return re.compile(rf"\b(?:(?P<safe>{safe})|(?P<term>{_alternation(terms)})(?:e?s)?)\b", re.IGNORECASE)
+
+INGREDIENT_FORM_PATTERN = re.compile(
+    rf"[\s-]+(?P<form>{_alternation(ALLERGEN_INGREDIENT_FORMS)})(?:e?s)?\b", re.IGNORECASE
+)
+# What may sit between the terms of one ingredient ('cashew nuts') and between
+# the items of a coordinated list ('ghee and butter', 'curd, cream or malai')
+COMPOUND_SEPARATOR = re.compile(r"[\s-]+")
+LIST_SEPARATOR = re.compile(r"\s*,\s*(?:(?:and|or)\s+)?|\s+(?:and|or|&)\s+", re.IGNORECASE)
+
+ALLERGEN_MATCHERS = {
+    allergen: compile_matcher(terms, ALLERGEN_EXCEPTIONS.get(allergen))
+    for allergen, terms in ALLERGEN_SYNONYMS.items()
+}
+
+def resolve_allergens(allergies):
+    """
+    Map user-entered allergies to known allergens
+
+    Returns:
+        (set of allergen names, list of allergies that match no known allergen)
+    """
+    allergens = set()
+    unknown = []
+    for allergy in normalize_allergies(allergies):
+        matched = {
+            allergen for allergen in ALLERGEN_MATCHERS
+            if allergy in allergen or allergen in allergy or allergy in ALLERGEN_SYNONYMS[allergen]
+        }
+        if matched:
+            allergens |= matched
+        else:
+            unknown.append(allergy)
+    return allergens, unknown
+
+def find_allergens(text, allergens):
+    """
+    Returns:
+        List of (allergen, matched text) for every allergen term found in the text
+    """
+    found = []
+    for allergen in allergens:
+        for match in ALLERGEN_MATCHERS[allergen].finditer(text):
+            if match.group('term'):
+                found.append((allergen, match.group(0)))
+    return found
+
+def pick_substitute(candidates, allergens):
+    """
+    First candidate that carries none of the active allergens
+    """
+    for candidate in candidates:
+        if not find_allergens(candidate, allergens):
+            return candidate
+    return None
+
+class UnsafeRecipeError(Exception):
+    pass
+
+@lru_cache(maxsize=64)
+def _compile_rewriter(allergens):
+    """
+    One matcher for the terms of every active allergen
+
+    Exception phrases that are themselves a term of another active allergen
+    (e.g. 'almond milk' with milk and tree nuts) are not treated as safe.
+
+    Returns:
+        (matcher, dict of term -> allergens it carries)
+    """
+    term_allergens = {}
+    for allergen in sorted(allergens):
+        for term in ALLERGEN_SYNONYMS[allergen]:
+            term_allergens.setdefault(term, []).append(allergen)
+    exceptions = {
+        phrase for allergen in allergens for phrase in ALLERGEN_EXCEPTIONS.get(allergen, [])
+        if phrase not in term_allergens
+    }
+    return compile_matcher(term_allergens, exceptions), term_allergens
+
+def _find_ingredient_lists(text, matcher):
+    """
+    Group the allergen terms in a text into coordinated lists of ingredients
+
+    Adjacent terms form one ingredient together with a following form word
+    ('cashew nuts', 'almond flakes'); ingredients joined by commas, 'and' or
+    'or' form one list ('ghee and butter').
+
+    Returns:
+        List of lists of ingredients, each a dict with start, end, terms and form
+    """
+    lists = []
+    for match in matcher.finditer(text):
+        if not match.group('term'):
+            continue
+        last = lists[-1][-1] if lists else None
+        if last and match.start() < last['end']:
+            continue
+        term = match.group('term').lower()
+        gap = text[last['end']:match.start()] if last else None
+        if last and last['form'] is None and COMPOUND_SEPARATOR.fullmatch(gap):
+            ingredient = last
+            ingredient['terms'].append(term)
+        else:
+            ingredient = {'start': match.start(), 'terms': [term], 'form': None}
+            if last and LIST_SEPARATOR.fullmatch(gap):
+                lists[-1].append(ingredient)
+            else:
+                lists.append([ingredient])
+        ingredient['end'] = match.end()
+        form = INGREDIENT_FORM_PATTERN.match(text, match.end())
+        if form:
+            ingredient['form'] = form.group('form').lower()
+            ingredient['end'] = form.end()
+    return lists
+
+def _ingredient_substitute(ingredient, original, term_allergens, allergens):
+    """
+    One substitute for a whole ingredient phrase, chosen by its last term
+
+    Raises:
+        UnsafeRecipeError: if the phrase has no safe local substitute
+    """
+    head = ingredient['terms'][-1]
+    if ingredient['form']:
+        candidates = [
+            candidate for allergen in term_allergens[head]
+            for candidate in ALLERGEN_FORM_SUBSTITUTES.get(allergen, {}).get(ingredient['form'], [])
+        ]
+        if not candidates:
+            raise UnsafeRecipeError(f"no substitute for this form of {original}")
+    else:
+        candidates = ALLERGEN_TERM_SUBSTITUTES.get(' '.join(ingredient['terms']), []) + \
+            ALLERGEN_TERM_SUBSTITUTES.get(head, []) + \
+            [candidate for allergen in term_allergens[head] for candidate in ALLERGEN_SUBSTITUTES.get(allergen, [])]
+    substitute = pick_substitute(candidates, allergens)
+    if substitute is None:
+        raise UnsafeRecipeError(f"no safe substitute for {original}")
+    return substitute
+
+def _rewrite(text, allergens, substitutions):
+    """
+    Replace every allergen-bearing ingredient phrase in a text
+
+    Each phrase is replaced once as a whole, and a coordinated list whose
+    items share a substitute names it only once ('ghee and butter' becomes
+    'vegetable oil', not 'vegetable oil and vegetable oil').
+    """
+    matcher, term_allergens = _compile_rewriter(frozenset(allergens))
+    pieces = []
+    position = 0
+    for ingredients in _find_ingredient_lists(text, matcher):
+        replaced = []
+        for ingredient in ingredients:
+            original = text[ingredient['start']:ingredient['end']]
+            substitute = _ingredient_substitute(ingredient, original, term_allergens, allergens)
+            substitutions.setdefault(original.lower(), {
+                'allergen': ', '.join(term_allergens[ingredient['terms'][-1]]),
+                'original': original.lower(),
+                'substitute': substitute
+            })
+            replaced.append(substitute)
+
+        start, end = ingredients[0]['start'], ingredients[-1]['end']
+        unique = list(dict.fromkeys(replaced))
+        if len(unique) == len(replaced):
+            rewritten = ''.join(
+                substitute + text[ingredient['end']:following['start']]
+                for substitute, ingredient, following in zip(replaced, ingredients, ingredients[1:])
+            ) + replaced[-1]
+        else:
+            conjunction = 'or' if re.search(r"\bor\b", text[start:end], re.IGNORECASE) else 'and'
+            rewritten = unique[0] if len(unique) == 1 else f"{', '.join(unique[:-1])} {conjunction} {unique[-1]}"
+        if text[start].isupper():
+            rewritten = rewritten[0].upper() + rewritten[1:]
+        pieces.append(text[position:start] + rewritten)
+        position = end
+    pieces.append(text[position:])
+    return ''.join(pieces)
+
+def make_recipe_safe(recipe_data, allergies):
+    """
+    Rewrite a recipe locally so it avoids the given allergies
+
+    Allergen-bearing ingredient phrases in the ingredients, instructions and
+    description are replaced using ALLERGEN_FORM_SUBSTITUTES,
+    ALLERGEN_TERM_SUBSTITUTES and ALLERGEN_SUBSTITUTES, and the result is
+    annotated with allergen_free and the substitutions made. A dish whose name
+    carries an allergen (e.g. paneer tikka for a milk allergy), an allergy that
+    matches no known allergen, a phrase with no safe substitute, or an
+    ingredient form with no phrase-level substitute (e.g. milk cream) means
+    the recipe cannot be made safe locally.
+
+    Args:
+        recipe_data: Recipe data in JSON format
+        allergies: List of allergies
+
+    Returns:
+        A rewritten copy of the recipe, the recipe itself if there are no
+        allergies, or None if it cannot be made safe locally
+    """
+    if not allergies:
+        return recipe_data
+
+    allergens, unknown = resolve_allergens(allergies)
+    if unknown:
+        logger.info(f"No local substitution rules for allergies: {unknown}")
+        return None
+    if find_allergens(str(recipe_data.get('name', '')), allergens):
+        logger.info(f"{recipe_data.get('name')} is defined by an allergen in {sorted(allergens)}")
+        return None
+
+    safe = copy.deepcopy(recipe_data)
+    substitutions = {}
+    try:
+        for field in ('ingredients', 'instructions'):
+            safe[field] = [
+                _rewrite(line, allergens, substitutions) if isinstance(line, str) else line
+                for line in recipe_data.get(field, [])
+            ]
+        if isinstance(recipe_data.get('description'), str):
+            safe['description'] = _rewrite(recipe_data['description'], allergens, substitutions)
+    except UnsafeRecipeError as e:
+        logger.info(f"Cannot make {recipe_data.get('name')} safe locally: {str(e)}")
+        return None
+
+    safe['allergen_free'] = allergies
+    safe['substitutions'] = list(substitutions.values())
+    return safe
@@ -0,0 +1,86 @@
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from config import UPLOAD_CACHE_MAX_ENTRIES, UPLOAD_CACHE_TTL_SECONDS
+from utils.helpers import normalize_allergies
+
+logger = logging.getLogger(__name__)
+
+class TTLCache:
+    """
+    Thread-safe in-memory cache with LRU eviction and per-entry expiry
+
+    Args:
+        max_size: Maximum number of entries kept; the least recently used is evicted first
+        ttl_seconds: Seconds an entry stays valid after it is stored
+        name: Name used in log messages and stats
+    """
+
+    def __init__(self, max_size, ttl_seconds, name='cache'):
+        self.max_size = max(1, int(max_size))
+        self.ttl_seconds = ttl_seconds
+        self.name = name
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'name': self.name,
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl_seconds': self.ttl_seconds,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations
+            }
+
+def make_upload_cache_key(image_data, servings, allergies, force_mode):
+    """
+    Build the cache key for an upload from the image bytes and its options
+
+    Allergies are normalized so their order and case do not matter.
+    """
+    image_hash = hashlib.sha256(image_data).hexdigest()
+    return f"{image_hash}|{servings}|{','.join(normalize_allergies(allergies))}|{force_mode}"
+
+upload_cache = TTLCache(UPLOAD_CACHE_MAX_ENTRIES, UPLOAD_CACHE_TTL_SECONDS, name='upload')
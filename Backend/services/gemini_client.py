@@ -0,0 +1,175 @@
+import json
+import time
+import random
+import logging
+import requests
+from requests.adapters import HTTPAdapter
+from config import (
+    GEMINI_API_KEY, GEMINI_API_ENDPOINT, GEMINI_STREAM_ENDPOINT, GEMINI_POOL_SIZE, GEMINI_CONNECT_TIMEOUT,
+    GEMINI_READ_TIMEOUT, GEMINI_MAX_RETRIES, GEMINI_BACKOFF_BASE, GEMINI_BACKOFF_MAX, HEDGING_ENABLED
+)
+from services.outbound_limiter import get_limiter, UpstreamRejected
+from services.hedging import make_hedger
+from utils.metrics import LatencyRecorder
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+class GeminiClient:
+    """
+    Shared Gemini API client with a pooled keep-alive session
+
+    Connections are reused across requests, every attempt has a connect and
+    read timeout, and 429/5xx responses, connection errors and timeouts are
+    retried with full-jitter exponential backoff (honouring Retry-After).
+
+    Args:
+        endpoint: generateContent URL including the API key
+        stream_endpoint: streamGenerateContent URL (alt=sse) including the API key
+        pool_size: Maximum number of kept-alive connections
+        connect_timeout: Seconds to wait for a connection
+        read_timeout: Seconds to wait for the response
+        max_retries: Retries after the first attempt
+        backoff_base: Base delay in seconds for the first retry
+        backoff_max: Upper bound for a single retry delay in seconds
+        limiter: OutboundLimiter every attempt is admitted through
+        hedging: Hedge slow post() calls (see services.hedging.Hedger)
+    """
+
+    def __init__(self, endpoint=GEMINI_API_ENDPOINT, stream_endpoint=GEMINI_STREAM_ENDPOINT, pool_size=GEMINI_POOL_SIZE,
+                 connect_timeout=GEMINI_CONNECT_TIMEOUT, read_timeout=GEMINI_READ_TIMEOUT,
+                 max_retries=GEMINI_MAX_RETRIES, backoff_base=GEMINI_BACKOFF_BASE, backoff_max=GEMINI_BACKOFF_MAX,
+                 limiter=None, hedging=HEDGING_ENABLED):
+        self.endpoint = endpoint
+        self.stream_endpoint = stream_endpoint
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max(0, max_retries)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.limiter = limiter or get_limiter('gemini')
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        self.call_metrics = LatencyRecorder('gemini_calls')
+        self.attempt_metrics = LatencyRecorder('gemini_attempts')
+        self.first_chunk_metrics = LatencyRecorder('gemini_stream_first_chunk')
+        self.hedger = make_hedger('gemini', self.call_metrics) if hedging else None
+
+    def _backoff(self, attempt, retry_after=None):
+        if retry_after:
+            try:
+                return min(self.backoff_max, float(retry_after))
+            except ValueError:
+                pass
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _send(self, endpoint, payload, call_start, stream=False):
+        for attempt in range(self.max_retries + 1):
+            attempt_start = time.perf_counter()
+            try:
+                # For streams the slot covers the attempt until the response headers arrive
+                with self.limiter.slot() as slot:
+                    response = self.session.post(endpoint, json=payload, timeout=self.timeout, stream=stream)
+                    if response.status_code in RETRY_STATUSES:
+                        slot.fail()
+            except UpstreamRejected:
+                self.call_metrics.record((time.perf_counter() - call_start) * 1000, 'rejected')
+                raise
+            except (requests.ConnectionError, requests.Timeout) as e:
+                self.attempt_metrics.record((time.perf_counter() - attempt_start) * 1000, type(e).__name__)
+                if attempt >= self.max_retries:
+                    self.call_metrics.record((time.perf_counter() - call_start) * 1000, 'error')
+                    raise
+                delay = self._backoff(attempt)
+                logger.warning(f"Gemini request failed ({str(e)}); retrying in {delay:.2f}s")
+                self.call_metrics.increment('retries')
+                time.sleep(delay)
+                continue
+
+            self.attempt_metrics.record((time.perf_counter() - attempt_start) * 1000, str(response.status_code))
+            if response.status_code in RETRY_STATUSES and attempt < self.max_retries:
+                delay = self._backoff(attempt, response.headers.get('Retry-After'))
+                logger.warning(f"Gemini returned {response.status_code}; retrying in {delay:.2f}s")
+                self.call_metrics.increment('retries')
+                response.close()
+                time.sleep(delay)
+                continue
+
+            try:
+                response.raise_for_status()
+            except requests.HTTPError:
+                self.call_metrics.record((time.perf_counter() - call_start) * 1000, 'error')
+                response.close()
+                raise
+            return response
+
+    def post(self, payload, endpoint=None):
+        """
+        POST a request body to Gemini, retrying transient failures
+
+        Args:
+            payload: JSON request body
+            endpoint: URL to call instead of the configured generateContent endpoint
+
+        Returns:
+            Decoded JSON response
+        """
+        if self.hedger is not None:
+            return self.hedger.call(self._post, payload, endpoint)
+        return self._post(payload, endpoint)
+
+    def _post(self, payload, endpoint=None):
+        call_start = time.perf_counter()
+        response = self._send(endpoint or self.endpoint, payload, call_start)
+        self.call_metrics.record((time.perf_counter() - call_start) * 1000, 'ok')
+        return response.json()
+
+    def stream(self, payload, endpoint=None):
+        """
+        POST a request body to streamGenerateContent and yield its server-sent events
+
+        Transient failures are retried like post() until the response starts;
+        an error after the first event is raised to the caller.
+
+        Args:
+            payload: JSON request body
+            endpoint: URL to call instead of the configured streaming endpoint
+
+        Yields:
+            Decoded JSON of each event (a partial GenerateContentResponse)
+        """
+        call_start = time.perf_counter()
+        response = self._send(endpoint or self.stream_endpoint, payload, call_start, stream=True)
+        response.encoding = 'utf-8'
+        outcome = 'error'
+        first_chunk = True
+        try:
+            # chunk_size=None hands over each chunk of the chunked response as it arrives
+            for line in response.iter_lines(chunk_size=None, decode_unicode=True):
+                if not line or not line.startswith('data:'):
+                    continue
+                if first_chunk:
+                    self.first_chunk_metrics.record((time.perf_counter() - call_start) * 1000)
+                    first_chunk = False
+                yield json.loads(line[len('data:'):].strip())
+            outcome = 'ok'
+        finally:
+            response.close()
+            self.call_metrics.record((time.perf_counter() - call_start) * 1000, outcome)
+
+    def stats(self):
+        return {
+            'calls': self.call_metrics.stats(),
+            'attempts': self.attempt_metrics.stats(),
+            'stream_first_chunk': self.first_chunk_metrics.stats(),
+            'hedging': self.hedger.stats() if self.hedger is not None else None
+        }
+
+if not GEMINI_API_KEY:
+    raise ValueError("GEMINI_API_KEY not found in environment variables")
+
+gemini_client = GeminiClient()
@@ -1,11 +1,64 @@
+import time
 import base64
-import json
+import hashlib
 import logging
-import requests
-from config import GEMINI_API_ENDPOINT, ALLERGEN_SUBSTITUTES
+from config import (
+    ALLERGEN_SUBSTITUTES, GEMINI_IMAGE_MAX_EDGE, GEMINI_IMAGE_JPEG_QUALITY,
+    GEMINI_COALESCE_ENABLED, GEMINI_COALESCE_WAIT_SECONDS, GEMINI_STRUCTURED_OUTPUT, GEMINI_MAX_OUTPUT_TOKENS,
+    GEMINI_MAX_OUTPUT_TOKENS_RETRY
+)
+from services.gemini_client import gemini_client
+from utils.helpers import prepare_image_for_upload, detect_mime_type, normalize_allergies
+from utils.json_stream import IncrementalJSONParser, extract_json
+from utils.metrics import LatencyRecorder
+from utils.singleflight import SingleFlight
 
 logger = logging.getLogger(__name__)
 
+image_prep_metrics = LatencyRecorder('gemini_image_prep')
+recipe_call_metrics = LatencyRecorder('gemini_recipe_calls')
+recipe_flights = SingleFlight('gemini_recipe', wait_timeout=GEMINI_COALESCE_WAIT_SECONDS)
+
+class RecipeTruncatedError(ValueError):
+    """
+    Raised when Gemini stops at the output token limit before the recipe is complete
+    """
+    pass
+
+RECIPE_FIELDS = ["name", "description", "ingredients", "instructions", "prepTime", "cookTime", "servings", "ytLink"]
+
+# Response schema for structured-output mode; field order matters for streaming
+RECIPE_RESPONSE_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        field: {"type": "ARRAY", "items": {"type": "STRING"}} if field in ("ingredients", "instructions")
+        else {"type": "STRING"}
+        for field in RECIPE_FIELDS
+    },
+    "required": RECIPE_FIELDS,
+    "propertyOrdering": RECIPE_FIELDS
+}
+
+# Prose description of the JSON shape, used when structured output is off
+LEGACY_FORMAT_INSTRUCTIONS = """
+    - List of ingredients with correct measurements for the given servings
+    - Step-by-step cooking instructions
+    - Cooking time and servings
+    - YouTube link for the dish
+    
+    Return the response in JSON format:
+    {
+        "name": "Dish Name",
+        "description": "Short description",
+        "ingredients": ["Ingredient 1", "Ingredient 2"],
+        "instructions": ["Step 1.", "Step 2."],
+        "prepTime": "preparation time",
+        "cookTime": "cooking time",
+        "servings": "servings",
+        "ytLink": "YouTube Link"
+    }
+    """
+
 def encode_image_to_base64(image_data):
     """
     Encode image data to base64 for Gemini API
@@ -16,12 +69,156 @@ def encode_image_to_base64(image_data):
         logger.error(f"Error encoding image: {str(e)}")
         raise
 
+def prepare_image(image_data):
+    """
+    Downscale and re-encode an image for the Gemini request
+
+    Returns:
+        (image bytes, MIME type)
+    """
+    if GEMINI_IMAGE_MAX_EDGE <= 0:
+        return image_data, detect_mime_type(image_data)
+
+    start = time.perf_counter()
+    prepared, mime_type = prepare_image_for_upload(image_data, GEMINI_IMAGE_MAX_EDGE, GEMINI_IMAGE_JPEG_QUALITY)
+    image_prep_metrics.record((time.perf_counter() - start) * 1000)
+    image_prep_metrics.increment('bytes_in', len(image_data))
+    image_prep_metrics.increment('bytes_out', len(prepared))
+
+    saved = len(image_data) - len(prepared)
+    logger.info(f"Prepared image for Gemini: {len(image_data)} -> {len(prepared)} bytes "
+                f"({mime_type}, saved {saved} bytes / {100 * saved / max(1, len(image_data)):.0f}%)")
+    return prepared, mime_type
+
+def build_recipe_request(image_data, predicted_class=None, servings=1, allergies=None):
+    """
+    Build the Gemini request body for a recipe
+
+    Args:
+        image_data: Binary image data, or None to send the prompt without the image
+        predicted_class: Class predicted by the model (optional)
+        servings: Number of servings to prepare (default: 1)
+        allergies: List of allergies to consider (optional)
+
+    Returns:
+        (request body, identification source)
+    """
+    allergy_guidance = ""
+    if allergies and isinstance(allergies, list) and len(allergies) > 0:
+        allergy_guidance = "Important: The person has the following allergies: " + ", ".join(allergies) + ". "
+        allergy_guidance += "Please avoid these allergens in the recipe and suggest appropriate substitutes. "
+        
+        for allergy in allergies:
+            allergy_lower = allergy.lower()
+            for allergen, substitutes in ALLERGEN_SUBSTITUTES.items():
+                if allergy_lower in allergen or allergen in allergy_lower:
+                    allergy_guidance += f"For {allergen}, you can use {', '.join(substitutes)}. "
+
+    if predicted_class:
+        subject = "The image is identified as" if image_data is not None else "The dish is"
+        identification_source = "model"
+    else:
+        identification_source = "gemini"
+
+    if GEMINI_STRUCTURED_OUTPUT:
+        dish = f"{subject} {predicted_class}, an Indian dish." if predicted_class else "Identify this dish."
+        prompt = (
+            f"{dish} {allergy_guidance}Write a simple recipe for {servings} servings: ingredients with "
+            "measurements, step-by-step instructions, prep and cook time, and a YouTube link for the dish."
+        )
+    elif predicted_class:
+        prompt = f"""
+        {subject} {predicted_class}, an Indian dish.
+        {allergy_guidance}
+        Generate a detailed simple format recipe adjusted for {servings} servings, with no formatting, including:
+        """
+    else:
+        prompt = f"""
+        Identify this dish and generate a detailed recipe for it, adjusting the ingredients for {servings} servings.
+        {allergy_guidance}
+        """
+
+    if not GEMINI_STRUCTURED_OUTPUT:
+        prompt += LEGACY_FORMAT_INSTRUCTIONS
+
+    parts = [{"text": prompt}]
+    if image_data is not None:
+        image_data, mime_type = prepare_image(image_data)
+        parts.append({
+            "inline_data": {
+                "mime_type": mime_type,
+                "data": encode_image_to_base64(image_data)
+            }
+        })
+    data = {"contents": [{"parts": parts}]}
+
+    generation_config = {}
+    if GEMINI_STRUCTURED_OUTPUT:
+        generation_config["responseMimeType"] = "application/json"
+        generation_config["responseSchema"] = RECIPE_RESPONSE_SCHEMA
+    if GEMINI_MAX_OUTPUT_TOKENS > 0:
+        generation_config["maxOutputTokens"] = GEMINI_MAX_OUTPUT_TOKENS
+    if generation_config:
+        data["generationConfig"] = generation_config
+    return data, identification_source
+
+def get_finish_reason(response_data):
+    return (response_data.get('candidates') or [{}])[0].get('finishReason', 'UNKNOWN')
+
+def get_output_limit(data):
+    return data.get('generationConfig', {}).get('maxOutputTokens', 0)
+
+def with_output_limit(data, max_output_tokens):
+    """
+    Copy of a request body with a different maxOutputTokens
+    """
+    return dict(data, generationConfig=dict(data.get('generationConfig', {}), maxOutputTokens=max_output_tokens))
+
+def next_output_limit(data):
+    """
+    The larger output token limit to retry a cut-off recipe with, or None if there is none
+    """
+    limit = get_output_limit(data)
+    return GEMINI_MAX_OUTPUT_TOKENS_RETRY if limit and GEMINI_MAX_OUTPUT_TOKENS_RETRY > limit else None
+
+def truncated_recipe_error(data):
+    limit = get_output_limit(data) or 'the model default'
+    return RecipeTruncatedError(f"Gemini stopped at the output token limit ({limit}) before the recipe was complete")
+
+def record_recipe_call(response_data, elapsed_ms, streamed=False):
+    """
+    Log and record token usage and latency of one recipe generation
+    """
+    usage = response_data.get('usageMetadata', {})
+    prompt_tokens = usage.get('promptTokenCount', 0)
+    output_tokens = usage.get('candidatesTokenCount', 0)
+    finish_reason = get_finish_reason(response_data)
+
+    recipe_call_metrics.record(elapsed_ms, finish_reason)
+    recipe_call_metrics.increment('prompt_tokens', prompt_tokens)
+    recipe_call_metrics.increment('output_tokens', output_tokens)
+    logger.info(f"Gemini recipe {'stream' if streamed else 'call'}: {elapsed_ms:.0f}ms, "
+                f"{prompt_tokens} prompt tokens, {output_tokens} output tokens, finish reason {finish_reason}")
+
+def finish_recipe(recipe_json, identification_source, allergies):
+    recipe_json["identification_source"] = identification_source
+    if allergies:
+        recipe_json["allergen_free"] = allergies
+    return recipe_json
+
+def make_recipe_request_key(image_data, predicted_class, servings, allergies):
+    image_hash = hashlib.sha256(image_data).hexdigest() if image_data is not None else ''
+    return f"{image_hash}|{(predicted_class or '').lower()}|{servings}|{','.join(normalize_allergies(allergies))}"
+
 def get_recipe_from_image(image_data, predicted_class=None, servings=1, allergies=None):
     """
     Get recipe from image using Gemini API with allergy considerations
     
+    Concurrent calls with the same image, dish, servings and allergies share
+    one Gemini request.
+    
     Args:
-        image_data: Binary image data
+        image_data: Binary image data, or None to send the prompt without the image
         predicted_class: Class predicted by the model (optional)
         servings: Number of servings to prepare (default: 1)
         allergies: List of allergies to consider (optional)
@@ -29,89 +226,107 @@ def get_recipe_from_image(image_data, predicted_class=None, servings=1, allergie
     Returns:
         Recipe data in JSON format
     """
-    try:
-        base64_image = encode_image_to_base64(image_data)
-        
-        allergy_guidance = ""
-        if allergies and isinstance(allergies, list) and len(allergies) > 0:
-            allergy_guidance = "Important: The person has the following allergies: " + ", ".join(allergies) + ". "
-            allergy_guidance += "Please avoid these allergens in the recipe and suggest appropriate substitutes. "
-            
-            for allergy in allergies:
-                allergy_lower = allergy.lower()
-                for allergen, substitutes in ALLERGEN_SUBSTITUTES.items():
-                    if allergy_lower in allergen or allergen in allergy_lower:
-                        allergy_guidance += f"For {allergen}, you can use {', '.join(substitutes)}. "
-        
-        if predicted_class:
-            prompt = f"""
-            The image is identified as {predicted_class}, an Indian dish.
-            {allergy_guidance}
-            Generate a detailed simple format recipe adjusted for {servings} servings, with no formatting, including:
-            """
-            identification_source = "model"
-        else:
-            prompt = f"""
-            Identify this dish and generate a detailed recipe for it, adjusting the ingredients for {servings} servings.
-            {allergy_guidance}
-            """
-            identification_source = "gemini"
-
-        prompt += """
-        - List of ingredients with correct measurements for the given servings
-        - Step-by-step cooking instructions
-        - Cooking time and servings
-        - YouTube link for the dish
-        
-        Return the response in JSON format:
-        {
-            "name": "Dish Name",
-            "description": "Short description",
-            "ingredients": ["Ingredient 1", "Ingredient 2"],
-            "instructions": ["Step 1.", "Step 2."],
-            "prepTime": "preparation time",
-            "cookTime": "cooking time",
-            "servings": "servings",
-            "ytLink": "YouTube Link"
-        }
-        """
+    if not GEMINI_COALESCE_ENABLED:
+        return _generate_recipe(image_data, predicted_class, servings, allergies)
+
+    key = make_recipe_request_key(image_data, predicted_class, servings, allergies)
+    return recipe_flights.do(key, _generate_recipe, image_data, predicted_class, servings, allergies)
+
+def post_recipe_request(data):
+    """
+    POST a recipe request to Gemini and record the call
+
+    A recipe cut off at the output token limit is requested once more with
+    GEMINI_MAX_OUTPUT_TOKENS_RETRY, since truncated JSON cannot be parsed.
+
+    Returns:
+        Decoded Gemini response
+
+    Raises:
+        RecipeTruncatedError: If the recipe is cut off and there is no larger limit to retry with
+    """
+    start = time.perf_counter()
+    response_data = gemini_client.post(data)
+    record_recipe_call(response_data, (time.perf_counter() - start) * 1000)
+    if get_finish_reason(response_data) != 'MAX_TOKENS':
+        return response_data
+
+    limit = next_output_limit(data)
+    if limit is None:
+        raise truncated_recipe_error(data)
+    logger.warning(f"Recipe was cut off at {get_output_limit(data)} output tokens; retrying with {limit}")
+    recipe_call_metrics.increment('max_tokens_retries')
+    return post_recipe_request(with_output_limit(data, limit))
+
+def parse_recipe_response(response_data):
+    if 'candidates' in response_data and response_data['candidates']:
+        recipe_text = response_data['candidates'][0]['content']['parts'][0]['text']
+        return extract_json(recipe_text)
 
-        headers = {'Content-Type': 'application/json'}
-        data = {
-            "contents": [{
-                "parts": [
-                    {"text": prompt},
-                    {
-                        "inline_data": {
-                            "mime_type": "image/jpeg",
-                            "data": base64_image
-                        }
-                    }
-                ]
-            }]
-        }
+    raise ValueError("No valid response from Gemini API")
+
+def _generate_recipe(image_data, predicted_class, servings, allergies):
+    try:
+        data, identification_source = build_recipe_request(image_data, predicted_class, servings, allergies)
 
         logger.info(f"Using identification source: {identification_source}")
         logger.info(f"Allergies considered: {allergies}")
         
-        response = requests.post(GEMINI_API_ENDPOINT, headers=headers, json=data)
-        response.raise_for_status()
-        
-        response_data = response.json()
-        
-        if 'candidates' in response_data and response_data['candidates']:
-            recipe_text = response_data['candidates'][0]['content']['parts'][0]['text']
-            recipe_json = json.loads(recipe_text.replace('```json', '').replace('```', '').strip())
-            
-            recipe_json["identification_source"] = identification_source
-            
-            if allergies:
-                recipe_json["allergen_free"] = allergies
-                
-            return recipe_json
-
-        raise ValueError("No valid response from Gemini API")
+        response_data = post_recipe_request(data)
+        return finish_recipe(parse_recipe_response(response_data), identification_source, allergies)
 
     except Exception as e:
         logger.error(f"Error generating recipe: {str(e)}")
-        raise
\ No newline at end of file
+        raise
+
+def stream_recipe_from_image(image_data, predicted_class=None, servings=1, allergies=None):
+    """
+    Generate a recipe with streamGenerateContent, yielding fields as they complete
+
+    Takes the same arguments as get_recipe_from_image.
+
+    Yields:
+        ('item', field, index, value) for each ingredient or instruction,
+        ('field', field, value) for each complete field, and finally
+        ('recipe', recipe) with the full recipe data
+    """
+    try:
+        data, identification_source = build_recipe_request(image_data, predicted_class, servings, allergies)
+        logger.info(f"Streaming recipe, identification source: {identification_source}")
+
+        parser = IncrementalJSONParser()
+        start = time.perf_counter()
+        last_chunk = {}
+        for chunk in gemini_client.stream(data):
+            last_chunk = chunk
+            for candidate in chunk.get('candidates', [])[:1]:
+                for part in candidate.get('content', {}).get('parts', []):
+                    yield from parser.feed(part.get('text', ''))
+        record_recipe_call(last_chunk, (time.perf_counter() - start) * 1000, streamed=True)
+
+        if get_finish_reason(last_chunk) == 'MAX_TOKENS':
+            # The events sent so far stand; the recipe event carries the complete retry
+            limit = next_output_limit(data)
+            if limit is None:
+                raise truncated_recipe_error(data)
+            logger.warning(f"Streamed recipe was cut off at {get_output_limit(data)} output tokens; "
+                           f"retrying with {limit}")
+            recipe_call_metrics.increment('max_tokens_retries')
+            recipe_json = parse_recipe_response(post_recipe_request(with_output_limit(data, limit)))
+        else:
+            recipe_json = parser.result()
+
+        yield 'recipe', finish_recipe(recipe_json, identification_source, allergies)
+
+    except Exception as e:
+        logger.error(f"Error streaming recipe: {str(e)}")
+        raise
+
+def get_recipe_for_class(predicted_class, servings=1, allergies=None):
+    """
+    Get recipe for a dish the model has already identified
+
+    The recipe depends only on the dish, servings and allergies, so the image
+    is not uploaded.
+    """
+    return get_recipe_from_image(None, predicted_class, servings, allergies)
@@ -0,0 +1,134 @@
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from config import HEDGE_PERCENTILE, HEDGE_MIN_DELAY_MS, HEDGE_MIN_SAMPLES, HEDGE_BUDGET_PERCENT, HEDGE_MAX_WORKERS
+
+logger = logging.getLogger(__name__)
+
+class Hedger:
+    """
+    Hedged calls for idempotent requests to a service with a long latency tail
+
+    The call runs on a worker thread. If it has not finished after the
+    recorder's rolling percentile latency (never less than min_delay_ms), an
+    identical second call is started and the first successful result wins.
+    Hedges are capped at budget_percent of the most recent calls, so a slow
+    upstream cannot double the load on itself. The losing call cannot be
+    interrupted mid-request; it is cancelled if it has not started yet,
+    otherwise it runs to completion in the background and its result is
+    discarded.
+
+    Args:
+        name: Name used in log messages and stats
+        recorder: LatencyRecorder with the upstream's call latencies
+        percentile: Percentile of recorded latencies used as the hedge delay
+        min_delay_ms: Lower bound for the hedge delay
+        min_samples: Calls recorded before hedging starts
+        budget_percent: Maximum share of calls that may be hedged
+        max_workers: Threads available for primary and hedge calls
+        window: Number of recent calls the budget is computed over
+    """
+
+    def __init__(self, name, recorder, percentile=95, min_delay_ms=200, min_samples=20,
+                 budget_percent=5, max_workers=32, window=1000):
+        self.name = name
+        self.recorder = recorder
+        self.percentile = percentile
+        self.min_delay_ms = min_delay_ms
+        self.min_samples = min_samples
+        self.budget_percent = budget_percent
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f'hedge-{name}')
+        self.window = window
+        self._hedged_at = deque()
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.budget_exhausted = 0
+
+    def hedge_delay(self):
+        """
+        Seconds to wait before hedging, or None while there are too few samples
+        """
+        if self.recorder.count() < self.min_samples:
+            return None
+        return max(self.min_delay_ms, self.recorder.percentile(self.percentile)) / 1000
+
+    def _take_budget(self):
+        """
+        Reserve a hedge if fewer than budget_percent of the last window calls were hedged
+
+        Each hedge is recorded with the call count at the time it was taken,
+        so the check and the reservation happen under one lock and concurrent
+        callers cannot overshoot the budget.
+        """
+        with self._lock:
+            while self._hedged_at and self._hedged_at[0] <= self.calls - self.window:
+                self._hedged_at.popleft()
+            if len(self._hedged_at) + 1 > self.budget_percent / 100 * min(self.calls, self.window):
+                self.budget_exhausted += 1
+                return False
+            self._hedged_at.append(self.calls)
+            self.hedged += 1
+            return True
+
+    def call(self, function, *args, **kwargs):
+        """
+        Run function(*args, **kwargs), hedging it if it is slow
+
+        Returns:
+            The first successful result; if every attempt fails, the primary call's exception is raised
+        """
+        with self._lock:
+            self.calls += 1
+
+        delay = self.hedge_delay()
+        if delay is None:
+            return function(*args, **kwargs)
+
+        primary = self._executor.submit(function, *args, **kwargs)
+        done, _ = wait([primary], timeout=delay)
+        if done or not self._take_budget():
+            return primary.result()
+
+        logger.info(f"Hedging {self.name} call after {delay * 1000:.0f}ms")
+        hedge = self._executor.submit(function, *args, **kwargs)
+        pending = {primary, hedge}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    for loser in pending:
+                        loser.cancel()
+                    if future is hedge:
+                        with self._lock:
+                            self.hedge_wins += 1
+                    return future.result()
+        return primary.result()
+
+    def stats(self):
+        with self._lock:
+            delay = self.hedge_delay()
+            return {
+                'name': self.name,
+                'calls': self.calls,
+                'hedged': self.hedged,
+                'hedge_wins': self.hedge_wins,
+                'budget_exhausted': self.budget_exhausted,
+                'budget_percent': self.budget_percent,
+                'hedge_delay_ms': round(delay * 1000, 2) if delay is not None else None
+            }
+
+def make_hedger(name, recorder):
+    """
+    Hedger for an upstream configured from the HEDGE_* settings
+    """
+    return Hedger(
+        name, recorder,
+        percentile=HEDGE_PERCENTILE,
+        min_delay_ms=HEDGE_MIN_DELAY_MS,
+        min_samples=HEDGE_MIN_SAMPLES,
+        budget_percent=HEDGE_BUDGET_PERCENT,
+        max_workers=HEDGE_MAX_WORKERS
+    )
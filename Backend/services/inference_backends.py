@@ -0,0 +1,222 @@
+import os
+import atexit
+import logging
+import threading
+from multiprocessing import shared_memory
+from multiprocessing.connection import Client
+import torch
+from services.runtime_service import cpu_supports_bf16
+
+logger = logging.getLogger(__name__)
+
+INFERENCE_BACKENDS = ('torch', 'torchscript', 'onnx', 'remote')
+
+def split_outputs(outputs):
+    """
+    Normalize model outputs to (logits, embeddings)
+
+    Graphs exported before embeddings were added return logits only, in
+    which case embeddings is None.
+    """
+    if isinstance(outputs, (tuple, list)):
+        return outputs[0], outputs[1] if len(outputs) > 1 else None
+    return outputs, None
+
+def _require_file(path, description):
+    if not os.path.isfile(path):
+        raise FileNotFoundError(
+            f"{description} not found at '{os.path.abspath(path)}'; "
+            "run 'python -m scripts.export_model' to create it"
+        )
+
+def require_authkey(authkey):
+    """
+    Validate the inference server's shared secret
+
+    multiprocessing connections unpickle what they receive, so anyone who
+    knows the key can run code in the peer; there is no default key.
+
+    Raises:
+        ValueError: If no key is configured
+    """
+    if not authkey:
+        raise ValueError("INFERENCE_SERVER_AUTHKEY must be set to a secret shared by the inference server and web workers")
+    return authkey
+
+class TorchBackend:
+    """
+    Eager PyTorch execution of a loaded nn.Module
+
+    Args:
+        model: Loaded model in eval mode
+        device: torch.device the model lives on
+        channels_last: Run convolutions on NHWC tensors
+        bf16_autocast: Run under bfloat16 autocast; ignored on CPUs without native bf16
+    """
+    name = 'torch'
+
+    def __init__(self, model, device, channels_last=False, bf16_autocast=False):
+        self.model = model
+        self.device = device
+        self.memory_format = torch.channels_last if channels_last else torch.contiguous_format
+        if channels_last:
+            self.model = self.model.to(memory_format=torch.channels_last)
+
+        if bf16_autocast and device.type == 'cpu' and not cpu_supports_bf16():
+            logger.warning("bfloat16 autocast requested but this CPU has no native bf16 support; using fp32")
+            bf16_autocast = False
+        self.bf16_autocast = bf16_autocast
+
+        logger.info(f"Eager torch optimizations: inference_mode=on, channels_last={'on' if channels_last else 'off'}, "
+                    f"bf16_autocast={'on' if bf16_autocast else 'off'}")
+
+    def __call__(self, batch):
+        batch = batch.contiguous(memory_format=self.memory_format)
+        if not self.bf16_autocast:
+            return split_outputs(self.model(batch))
+
+        with torch.autocast(device_type=self.device.type, dtype=torch.bfloat16):
+            logits, embeddings = split_outputs(self.model(batch))
+        return logits.float(), embeddings.float() if embeddings is not None else None
+
+class TorchScriptBackend:
+    """
+    Execution of an exported TorchScript module; does not need timm
+    """
+    name = 'torchscript'
+
+    def __init__(self, path, device):
+        _require_file(path, "TorchScript model")
+        self.model = torch.jit.optimize_for_inference(torch.jit.load(path, map_location=device).eval())
+
+    def __call__(self, batch):
+        return split_outputs(self.model(batch))
+
+class OnnxBackend:
+    """
+    Execution of an exported ONNX graph with ONNX Runtime on CPU
+    """
+    name = 'onnx'
+
+    def __init__(self, path):
+        _require_file(path, "ONNX model")
+        try:
+            import onnxruntime
+        except ImportError:
+            raise ImportError(
+                "INFERENCE_BACKEND=onnx needs onnxruntime, an optional dependency; "
+                "install it with 'pip install -r requirements-onnx.txt'"
+            ) from None
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.intra_op_num_threads = torch.get_num_threads()
+        options.inter_op_num_threads = 1
+        self.session = onnxruntime.InferenceSession(path, options, providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def __call__(self, batch):
+        outputs = self.session.run(None, {self.input_name: batch.detach().cpu().numpy()})
+        return split_outputs([torch.from_numpy(output) for output in outputs])
+
+def parse_address(address):
+    host, port = address.rsplit(':', 1)
+    return host, int(port)
+
+class RemoteBackend:
+    """
+    Execution on the shared inference server (services/inference_server.py)
+
+    The batch is copied into a shared-memory block owned by this process and
+    only the block name and shape travel over the socket, so the server's
+    worker processes read the pixels without another copy. This process never
+    loads the model.
+    """
+    name = 'remote'
+
+    def __init__(self, address, authkey, max_batch_shape):
+        self.address = parse_address(address)
+        self.authkey = require_authkey(authkey)
+        self.max_elements = 1
+        for dim in max_batch_shape:
+            self.max_elements *= dim
+        self.buffer = shared_memory.SharedMemory(create=True, size=self.max_elements * 4)
+        self._connection = None
+        self._lock = threading.Lock()
+        atexit.register(self.close)
+
+    def _connect(self):
+        if self._connection is None:
+            self._connection = Client(self.address, authkey=self.authkey)
+        return self._connection
+
+    def __call__(self, batch):
+        batch = batch.detach().to('cpu', torch.float32).contiguous()
+        if batch.numel() > self.max_elements:
+            raise ValueError(f"Batch of shape {tuple(batch.shape)} does not fit the shared buffer")
+
+        with self._lock:
+            shared = torch.frombuffer(self.buffer.buf, dtype=torch.float32, count=batch.numel())
+            shared.copy_(batch.view(-1))
+            del shared
+            try:
+                connection = self._connect()
+                connection.send((self.buffer.name, tuple(batch.shape)))
+                status, payload = connection.recv()
+            except (OSError, EOFError):
+                self._connection = None
+                raise
+
+        if status != 'ok':
+            raise RuntimeError(f"Inference server error: {payload}")
+        logits, embeddings = payload
+        return torch.from_numpy(logits), torch.from_numpy(embeddings) if embeddings is not None else None
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+            if self.buffer is not None:
+                self.buffer.close()
+                self.buffer.unlink()
+                self.buffer = None
+
+def create_backend(name, device, model=None, torchscript_path=None, onnx_path=None,
+                   server_address=None, server_authkey=None, max_batch_shape=None,
+                   channels_last=False, bf16_autocast=False):
+    """
+    Create the inference backend used by model_service
+
+    Args:
+        name: One of 'torch', 'torchscript', 'onnx' or 'remote'
+        device: torch.device the backend should run on
+        model: Loaded nn.Module, required for 'torch'
+        torchscript_path: Path of the exported TorchScript file
+        onnx_path: Path of the exported ONNX file
+        server_address: host:port of the inference server, for 'remote'
+        server_authkey: Shared secret of the inference server, for 'remote'
+        max_batch_shape: Largest batch shape sent to the server, for 'remote'
+        channels_last: Use channels_last memory format, for 'torch'
+        bf16_autocast: Use bfloat16 autocast where supported, for 'torch'
+
+    Returns:
+        Callable mapping an Nx3x224x224 batch tensor to a (logits, embeddings)
+        tuple; embeddings is None when the backend's graph does not expose them
+    """
+    if name not in INFERENCE_BACKENDS:
+        raise ValueError(f"Unknown inference backend '{name}', expected one of {INFERENCE_BACKENDS}")
+
+    if name == 'torch':
+        backend = TorchBackend(model, device, channels_last=channels_last, bf16_autocast=bf16_autocast)
+    elif name == 'torchscript':
+        backend = TorchScriptBackend(torchscript_path, device)
+    elif name == 'remote':
+        backend = RemoteBackend(server_address, server_authkey, max_batch_shape)
+    else:
+        if device.type != 'cpu':
+            logger.warning(f"ONNX backend runs on CPU; ignoring device {device}")
+        backend = OnnxBackend(onnx_path)
+
+    logger.info(f"Using '{backend.name}' inference backend")
+    return backend
@@ -0,0 +1,105 @@
+import queue
+import threading
+import time
+import logging
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+class MicroBatcher:
+    """
+    Collect individual inference requests into batches
+
+    Requests are queued by callers and a single background thread groups them
+    into a batch once either max_batch_size items are waiting or max_wait_ms
+    has passed since the first item of the batch arrived. The batch function
+    receives the list of queued items and must return one result per item,
+    which is routed back to the matching caller.
+
+    Args:
+        run_batch: Callable taking a list of items and returning a list of results
+        max_batch_size: Maximum number of items per batch (default: 8)
+        max_wait_ms: Maximum time to wait for a batch to fill (default: 5)
+        name: Name used for the worker thread and log messages
+    """
+
+    def __init__(self, run_batch, max_batch_size=8, max_wait_ms=5.0, name='inference-batcher'):
+        self.run_batch = run_batch
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.name = name
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stopped = False
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopped = False
+                self._thread = threading.Thread(target=self._worker, name=self.name, daemon=True)
+                self._thread.start()
+                logger.info(f"Started {self.name} (max_batch_size={self.max_batch_size}, "
+                            f"max_wait_ms={self.max_wait * 1000:g})")
+
+    def stop(self):
+        with self._lock:
+            self._stopped = True
+            self._queue.put(None)
+
+    def submit(self, item):
+        """
+        Queue a single item for batched execution
+
+        Returns:
+            Future resolved with the result for this item
+        """
+        if self._stopped:
+            raise RuntimeError(f"{self.name} is stopped")
+        self.start()
+        future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def infer(self, item, timeout=None):
+        """
+        Queue a single item and block until its result is available
+        """
+        return self.submit(item).result(timeout=timeout)
+
+    def _collect_batch(self, first):
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                entry = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if entry is None:
+                self._queue.put(None)
+                break
+            batch.append(entry)
+        return batch
+
+    def _worker(self):
+        while True:
+            entry = self._queue.get()
+            if entry is None:
+                break
+
+            batch = self._collect_batch(entry)
+            batch = [(item, future) for item, future in batch if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+
+            try:
+                results = self.run_batch([item for item, _ in batch])
+                if len(results) != len(batch):
+                    raise RuntimeError(f"Batch function returned {len(results)} results for {len(batch)} items")
+                for (_, future), result in zip(batch, results):
+                    future.set_result(result)
+            except Exception as e:
+                logger.error(f"Error running batch of {len(batch)} in {self.name}: {str(e)}")
+                for _, future in batch:
+                    future.set_exception(e)
@@ -0,0 +1,143 @@
+"""
+Shared inference server for multi-process deployments
+
+The model lives in a small pool of dedicated worker processes instead of in
+every web worker. Workers load the checkpoint memory-mapped (MODEL_MMAP_WEIGHTS),
+so the weights are held once in the page cache however many workers run. Web
+workers use the 'remote' inference backend: they write preprocessed batches
+into their own shared-memory block and send only its name and shape here.
+
+Usage (from the Backend directory, with the same INFERENCE_SERVER_AUTHKEY
+set for the server and the web workers):
+    INFERENCE_SERVER_AUTHKEY=<secret> python -m services.inference_server --workers 2
+"""
+import os
+import argparse
+import logging
+import threading
+import multiprocessing
+from multiprocessing import shared_memory, resource_tracker
+from multiprocessing.connection import Listener
+from concurrent.futures import ProcessPoolExecutor
+import torch
+from config import (
+    INFERENCE_SERVER_ADDRESS, INFERENCE_SERVER_AUTHKEY, INFERENCE_SERVER_WORKERS, INFERENCE_SERVER_BACKEND,
+    TORCH_NUM_THREADS, TORCH_INTEROP_THREADS
+)
+from services.inference_backends import parse_address, require_authkey
+from services.runtime_service import configure_torch_runtime, thread_budget, available_cpus
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTACHED_BUFFERS = 64
+
+_worker_backend = None
+_worker_buffers = {}
+
+def _init_worker(backend_name, num_threads):
+    global _worker_backend
+
+    configure_torch_runtime(num_threads=num_threads, interop_threads=TORCH_INTEROP_THREADS)
+    from services.model_service import load_inference_backend
+    _worker_backend = load_inference_backend(backend_name)
+    logger.info(f"Inference worker {os.getpid()} ready with {num_threads} threads")
+
+def _attach_buffer(name):
+    buffer = _worker_buffers.get(name)
+    if buffer is None:
+        buffer = shared_memory.SharedMemory(name=name)
+        # The web worker that created the block owns and unlinks it
+        resource_tracker.unregister(buffer._name, 'shared_memory')
+        _worker_buffers[name] = buffer
+        if len(_worker_buffers) > MAX_ATTACHED_BUFFERS:
+            stale = _worker_buffers.pop(next(iter(_worker_buffers)))
+            stale.close()
+    return buffer
+
+def _worker_pid(_):
+    return os.getpid()
+
+def _run_batch(buffer_name, shape):
+    buffer = _attach_buffer(buffer_name)
+    count = 1
+    for dim in shape:
+        count *= dim
+
+    batch = torch.frombuffer(buffer.buf, dtype=torch.float32, count=count).view(*shape)
+    with torch.inference_mode():
+        logits, embeddings = _worker_backend(batch)
+    del batch
+    return logits.cpu().numpy(), embeddings.cpu().numpy() if embeddings is not None else None
+
+class InferenceServer:
+    """
+    Accept connections from web workers and run their batches on the worker pool
+
+    Args:
+        address: host:port to listen on
+        authkey: Shared secret clients must present
+        workers: Number of inference worker processes
+        backend_name: Inference backend each worker loads
+    """
+
+    def __init__(self, address=INFERENCE_SERVER_ADDRESS, authkey=INFERENCE_SERVER_AUTHKEY,
+                 workers=INFERENCE_SERVER_WORKERS, backend_name=INFERENCE_SERVER_BACKEND):
+        self.address = parse_address(address)
+        self.authkey = require_authkey(authkey)
+        self.workers = max(1, workers)
+        self.backend_name = backend_name
+        self.executor = None
+
+    def start_workers(self):
+        num_threads = thread_budget(TORCH_NUM_THREADS, self.workers, available_cpus())
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+            initargs=(self.backend_name, num_threads)
+        )
+        # Force every worker to start and load the model before accepting traffic
+        list(self.executor.map(_worker_pid, range(self.workers)))
+        logger.info(f"Started {self.workers} inference workers ({self.backend_name} backend)")
+
+    def _handle_connection(self, connection):
+        try:
+            while True:
+                buffer_name, shape = connection.recv()
+                try:
+                    outputs = self.executor.submit(_run_batch, buffer_name, shape).result()
+                    connection.send(('ok', outputs))
+                except Exception as e:
+                    logger.error(f"Error running remote batch: {str(e)}")
+                    connection.send(('error', str(e)))
+        except (EOFError, OSError):
+            pass
+        finally:
+            connection.close()
+
+    def serve_forever(self):
+        if self.executor is None:
+            self.start_workers()
+
+        with Listener(self.address, authkey=self.authkey) as listener:
+            logger.info(f"Inference server listening on {self.address[0]}:{self.address[1]}")
+            while True:
+                try:
+                    connection = listener.accept()
+                except Exception as e:
+                    logger.error(f"Rejected inference client: {str(e)}")
+                    continue
+                threading.Thread(target=self._handle_connection, args=(connection,), daemon=True).start()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--address', default=INFERENCE_SERVER_ADDRESS)
+    parser.add_argument('--workers', type=int, default=INFERENCE_SERVER_WORKERS)
+    parser.add_argument('--backend', default=INFERENCE_SERVER_BACKEND, choices=['torch', 'torchscript', 'onnx'])
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    InferenceServer(args.address, INFERENCE_SERVER_AUTHKEY, args.workers, args.backend).serve_forever()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,213 @@
+import time
+import uuid
+import queue
+import logging
+import threading
+from config import JOB_WORKERS, JOB_MAX_QUEUE, JOB_RESULT_TTL_SECONDS
+from utils.metrics import LatencyRecorder
+
+logger = logging.getLogger(__name__)
+
+class JobQueueFull(Exception):
+    pass
+
+class Job:
+    """
+    One queued unit of work and its outcome
+
+    Status goes queued -> running -> done or failed. wait_for_change() lets
+    pollers and event streams block until the status moves on.
+    """
+
+    def __init__(self, function, args, kwargs, metadata=None):
+        self.id = uuid.uuid4().hex
+        self.function = function
+        self.args = args
+        self.kwargs = kwargs
+        self.metadata = metadata or {}
+        self.status = 'queued'
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._condition = threading.Condition()
+
+    @property
+    def finished(self):
+        return self.status in ('done', 'failed')
+
+    def _set_status(self, status):
+        with self._condition:
+            self.status = status
+            self._condition.notify_all()
+
+    def wait_for_change(self, status, timeout):
+        """
+        Block until the status differs from the given one or the timeout passes
+
+        Returns:
+            The current status
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: self.status != status, timeout)
+            return self.status
+
+    def to_dict(self):
+        job = {
+            'job_id': self.id,
+            'status': self.status,
+            'age_seconds': round(time.time() - self.created_at, 3)
+        }
+        job.update(self.metadata)
+        if self.status == 'done':
+            job['result'] = self.result
+        elif self.status == 'failed':
+            job['error'] = self.error
+        return job
+
+class JobQueue:
+    """
+    In-process job queue served by a fixed pool of worker threads
+
+    submit() returns immediately; workers run jobs in FIFO order. When
+    max_queue jobs are already waiting, submit() raises JobQueueFull instead
+    of letting the backlog grow. Finished jobs are kept for result_ttl
+    seconds so clients can fetch them.
+
+    Args:
+        workers: Number of worker threads
+        max_queue: Maximum number of jobs waiting to start
+        result_ttl: Seconds a finished job is kept
+        name: Name used for threads, log messages and stats
+    """
+
+    def __init__(self, workers, max_queue, result_ttl, name='jobs'):
+        self.workers = max(1, int(workers))
+        self.result_ttl = result_ttl
+        self.name = name
+        self._queue = queue.Queue(maxsize=max(1, int(max_queue)))
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._threads = []
+        self._busy = 0
+        self._busy_seconds = 0.0
+        self._started_at = None
+        self.wait_metrics = LatencyRecorder(f'{name}_queue_wait')
+        self.run_metrics = LatencyRecorder(f'{name}_run')
+
+    def start(self):
+        with self._lock:
+            if self._threads:
+                return
+            self._started_at = time.monotonic()
+            for index in range(self.workers):
+                thread = threading.Thread(target=self._worker, name=f'{self.name}-worker-{index}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+        logger.info(f"Started {self.workers} {self.name} workers")
+
+    def submit(self, function, *args, metadata=None, **kwargs):
+        """
+        Queue function(*args, **kwargs) to run on a worker
+
+        Args:
+            metadata: Extra fields included in the job's to_dict()
+
+        Returns:
+            The queued Job
+
+        Raises:
+            JobQueueFull: If max_queue jobs are already waiting
+        """
+        self.start()
+        self._purge_finished()
+        job = Job(function, args, kwargs, metadata)
+        with self._lock:
+            self._jobs[job.id] = job
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            with self._lock:
+                del self._jobs[job.id]
+            self.wait_metrics.increment('rejected')
+            raise JobQueueFull(f"{self.name} queue is full ({self._queue.maxsize} waiting)")
+        return job
+
+    def add_finished(self, result, metadata=None):
+        """
+        Record a job that is already done, e.g. a result served from a cache
+
+        Returns:
+            The finished Job
+        """
+        self._purge_finished()
+        job = Job(None, (), {}, metadata)
+        job.result = result
+        job.started_at = job.finished_at = job.created_at
+        job.status = 'done'
+        with self._lock:
+            self._jobs[job.id] = job
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _worker(self):
+        while True:
+            job = self._queue.get()
+            start = time.monotonic()
+            job.started_at = time.time()
+            self.wait_metrics.record((job.started_at - job.created_at) * 1000)
+            with self._lock:
+                self._busy += 1
+            job._set_status('running')
+            try:
+                job.result = job.function(*job.args, **job.kwargs)
+                status = 'done'
+            except Exception as e:
+                logger.error(f"Error running job {job.id}: {str(e)}")
+                job.error = str(e)
+                status = 'failed'
+            finally:
+                elapsed = time.monotonic() - start
+                with self._lock:
+                    self._busy -= 1
+                    self._busy_seconds += elapsed
+
+            job.finished_at = time.time()
+            self.run_metrics.record(elapsed * 1000, status)
+            job._set_status(status)
+            self._queue.task_done()
+
+    def _purge_finished(self):
+        cutoff = time.time() - self.result_ttl
+        with self._lock:
+            expired = [job_id for job_id, job in self._jobs.items() if job.finished and job.finished_at < cutoff]
+            for job_id in expired:
+                del self._jobs[job_id]
+
+    def stats(self):
+        now = time.time()
+        with self._lock:
+            jobs = list(self._jobs.values())
+            busy = self._busy
+            uptime = time.monotonic() - self._started_at if self._started_at else 0.0
+            busy_seconds = self._busy_seconds
+
+        queued = [job for job in jobs if job.status == 'queued']
+        return {
+            'workers': self.workers,
+            'busy_workers': busy,
+            'utilisation': round(busy_seconds / (uptime * self.workers), 4) if uptime else 0.0,
+            'queue_depth': len(queued),
+            'max_queue': self._queue.maxsize,
+            'running': sum(job.status == 'running' for job in jobs),
+            'oldest_queued_age_seconds': round(max((now - job.created_at for job in queued), default=0.0), 3),
+            'retained_jobs': len(jobs),
+            'queue_wait': self.wait_metrics.stats(),
+            'run': self.run_metrics.stats()
+        }
+
+job_queue = JobQueue(JOB_WORKERS, JOB_MAX_QUEUE, JOB_RESULT_TTL_SECONDS, name='recipe_jobs')
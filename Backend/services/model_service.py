@@ -1,27 +1,71 @@
 import torch
 import torchvision.transforms as transforms
-import timm
+import os
 import logging
+import threading
 from PIL import Image
-from config import MODEL_WEIGHTS_PATH
+from config import (
+    MODEL_WEIGHTS_PATH, MODEL_MMAP_WEIGHTS, INFERENCE_MAX_BATCH_SIZE, INFERENCE_MAX_WAIT_MS, MODEL_WARMUP_ITERATIONS,
+    MODEL_QUANTIZATION, QUANTIZATION_CALIBRATION_DIR, QUANTIZATION_CALIBRATION_LIMIT,
+    INFERENCE_BACKEND, TORCHSCRIPT_MODEL_PATH, ONNX_MODEL_PATH,
+    INFERENCE_SERVER_ADDRESS, INFERENCE_SERVER_AUTHKEY,
+    WEB_CONCURRENCY, TORCH_NUM_THREADS, TORCH_INTEROP_THREADS, CPU_AFFINITY, WORKER_INDEX,
+    INFERENCE_CHANNELS_LAST, INFERENCE_BF16_AUTOCAST
+)
+from services.inference_batcher import MicroBatcher
+from services.inference_backends import create_backend
+from services.runtime_service import configure_torch_runtime
+from services.quantization_service import quantize_model, load_calibration_tensors
 
 logger = logging.getLogger(__name__)
 
 device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
 logger.info(f"Using device: {device}")
 
+model = None
+class_labels = []
+_model_lock = threading.Lock()
+_model_ready = threading.Event()
+
 class CustomEfficientNet(torch.nn.Module):
-    def __init__(self, num_classes=206):  
+    def __init__(self, num_classes=206, pretrained=False):
         super(CustomEfficientNet, self).__init__()
-        self.model = timm.create_model('efficientnet_b0', pretrained=True)
+        # Imported here so TorchScript/ONNX workers never import timm
+        import timm
+
+        # Our checkpoint replaces every weight, so ImageNet weights are only
+        # fetched when explicitly asked for (e.g. for retraining)
+        self.model = timm.create_model('efficientnet_b0', pretrained=pretrained)
         self.model.classifier = torch.nn.Linear(self.model.num_features, num_classes)
 
     def forward(self, x):
         return self.model(x)
 
+    def forward_with_embedding(self, x):
+        """
+        Return logits together with the pooled penultimate features
+        """
+        embedding = self.model.forward_head(self.model.forward_features(x), pre_logits=True)
+        return self.model.classifier(embedding), embedding
+
+class ClassifierWithEmbedding(torch.nn.Module):
+    """
+    Make (logits, embedding) the forward outputs of CustomEfficientNet so that
+    quantization and graph export keep both
+    """
+
+    def __init__(self, model):
+        super(ClassifierWithEmbedding, self).__init__()
+        self.model = model
+
+    def forward(self, x):
+        return self.model.forward_with_embedding(x)
+
+INPUT_SIZE = 224
+
 transform = transforms.Compose([
-    transforms.Resize(224),
-    transforms.CenterCrop(224),
+    transforms.Resize(INPUT_SIZE),
+    transforms.CenterCrop(INPUT_SIZE),
     transforms.ToTensor(),
     transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
 ])
@@ -65,46 +109,260 @@ def load_class_labels():
         logger.error(f"Error loading class labels: {str(e)}")
         return []
 
-def load_model():
+def _load_state_dict(weights_path, mmap):
+    if mmap:
+        try:
+            return torch.load(weights_path, map_location='cpu', weights_only=True, mmap=True)
+        except RuntimeError as e:
+            logger.warning(f"Cannot memory-map {weights_path} ({str(e)}); loading it into memory")
+    return torch.load(weights_path, map_location='cpu', weights_only=True)
+
+def load_model(weights_path=MODEL_WEIGHTS_PATH, mmap=MODEL_MMAP_WEIGHTS):
+    """
+    Build CustomEfficientNet without downloading anything and load our checkpoint
+
+    With mmap, parameters are assigned straight from the memory-mapped
+    checkpoint, so processes on the same host share the weight pages instead
+    of each holding a private copy.
+
+    Raises:
+        FileNotFoundError: If the checkpoint does not exist
+    """
+    if not os.path.isfile(weights_path):
+        raise FileNotFoundError(
+            f"Model checkpoint not found at '{os.path.abspath(weights_path)}'; "
+            "set MODEL_WEIGHTS_PATH to the trained weights file"
+        )
+
     try:
-        model = CustomEfficientNet().to(device)
-        model.load_state_dict(torch.load(MODEL_WEIGHTS_PATH, map_location=device))
+        model = CustomEfficientNet(pretrained=False)
+        model.load_state_dict(_load_state_dict(weights_path, mmap), assign=mmap)
+        model.to(device)
         model.eval()
-        logger.info("Model loaded successfully")
+        logger.info(f"Model loaded successfully from {weights_path}")
         return model
     except Exception as e:
         logger.error(f"Error loading model: {str(e)}")
-        return None
+        raise
 
-def predict_food_from_image(image):
-    try:
-        global model, class_labels
-        
-        if 'model' not in globals() or model is None:
-            model = load_model()
-        
-        if 'class_labels' not in globals() or not class_labels:
+def quantize_loaded_model(model, mode=MODEL_QUANTIZATION):
+    """
+    Apply the configured INT8 quantization mode to a loaded fp32 model
+    """
+    if mode == 'none':
+        return model
+
+    if device.type != 'cpu':
+        logger.warning(f"INT8 quantization only runs on CPU; keeping fp32 model on {device}")
+        return model
+
+    calibration_tensors = None
+    if mode == 'static':
+        calibration_tensors = load_calibration_tensors(
+            QUANTIZATION_CALIBRATION_DIR, transform, QUANTIZATION_CALIBRATION_LIMIT
+        )
+    return quantize_model(model, mode, calibration_tensors)
+
+def load_inference_backend(name=INFERENCE_BACKEND):
+    """
+    Create the configured inference backend
+
+    Only the eager 'torch' backend builds CustomEfficientNet; the exported
+    TorchScript and ONNX backends load their graph files directly and
+    'remote' forwards batches to the shared inference server.
+    """
+    if name == 'torch':
+        # INT8 kernels have their own layout and dtype, so the fp32 fast path only applies unquantized
+        quantized = MODEL_QUANTIZATION != 'none' and device.type == 'cpu'
+        return create_backend(
+            name, device,
+            model=quantize_loaded_model(ClassifierWithEmbedding(load_model())),
+            channels_last=INFERENCE_CHANNELS_LAST and not quantized,
+            bf16_autocast=INFERENCE_BF16_AUTOCAST and not quantized
+        )
+
+    return create_backend(
+        name, device,
+        torchscript_path=TORCHSCRIPT_MODEL_PATH,
+        onnx_path=ONNX_MODEL_PATH,
+        server_address=INFERENCE_SERVER_ADDRESS,
+        server_authkey=INFERENCE_SERVER_AUTHKEY,
+        max_batch_shape=(INFERENCE_MAX_BATCH_SIZE, 3, INPUT_SIZE, INPUT_SIZE)
+    )
+
+def warmup_model(model, iterations=MODEL_WARMUP_ITERATIONS):
+    """
+    Run dummy forward passes so allocator and kernel setup happen before real traffic
+
+    Args:
+        model: Inference backend or loaded model in eval mode
+        iterations: Number of dummy passes at each warmup batch size
+    """
+    batch_sizes = sorted({1, max(1, INFERENCE_MAX_BATCH_SIZE)})
+    with torch.inference_mode():
+        for batch_size in batch_sizes:
+            dummy = torch.zeros(batch_size, 3, INPUT_SIZE, INPUT_SIZE, device=device)
+            for _ in range(iterations):
+                model(dummy)
+    logger.info(f"Model warmed up with {iterations} passes at batch sizes {batch_sizes}")
+
+def init_model(warmup_iterations=MODEL_WARMUP_ITERATIONS):
+    """
+    Load class labels and model once, then warm the model up
+
+    Safe to call from several threads; only the first caller does the work.
+
+    Returns:
+        True once the model is loaded and ready to serve predictions
+
+    Raises:
+        FileNotFoundError: If the checkpoint or exported model is missing
+        RuntimeError: If the class labels are not available
+    """
+    global model, class_labels
+
+    if _model_ready.is_set():
+        return True
+
+    with _model_lock:
+        if _model_ready.is_set():
+            return True
+
+        if not class_labels:
             class_labels = load_class_labels()
-            
-        if not class_labels or model is None:
-            logger.error("Model or class labels are not available")
-            return None, 0.0
+        if model is None:
+            configure_torch_runtime(
+                num_threads=TORCH_NUM_THREADS,
+                interop_threads=TORCH_INTEROP_THREADS,
+                workers_per_host=WEB_CONCURRENCY,
+                cpu_affinity=CPU_AFFINITY,
+                worker_index=WORKER_INDEX
+            )
+            model = load_inference_backend()
+
+        if not class_labels:
+            raise RuntimeError("Class labels are not available")
+
+        warmup_model(model, warmup_iterations)
+        get_batcher().start()
+        _model_ready.set()
+        return True
+
+def is_model_ready():
+    return _model_ready.is_set()
+
+def run_inference_batch(image_tensors):
+    """
+    Run one forward pass over a list of preprocessed image tensors
+
+    Args:
+        image_tensors: List of 3x224x224 tensors produced by transform
+
+    Returns:
+        List of (probabilities, embedding) rows, one per input tensor;
+        embedding is None if the backend does not expose embeddings
+    """
+    batch = torch.stack(image_tensors).to(device)
+
+    with torch.inference_mode():
+        logits, embeddings = model(batch)
+        probabilities = torch.nn.functional.softmax(logits, dim=1).cpu()
+
+    if embeddings is None:
+        return [(row, None) for row in probabilities]
+    return list(zip(probabilities, embeddings.cpu()))
+
+_batcher = None
+_batcher_lock = threading.Lock()
+
+def get_batcher():
+    global _batcher
+
+    if _batcher is None:
+        with _batcher_lock:
+            if _batcher is None:
+                _batcher = MicroBatcher(
+                    run_inference_batch,
+                    max_batch_size=INFERENCE_MAX_BATCH_SIZE,
+                    max_wait_ms=INFERENCE_MAX_WAIT_MS
+                )
+    return _batcher
+
+def _preprocess(image):
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    return transform(image)
 
-        if image.mode != 'RGB':
-            image = image.convert('RGB')
+def _to_prediction(probabilities):
+    max_prob, predicted = torch.max(probabilities, 0)
 
-        image_tensor = transform(image).unsqueeze(0).to(device)
+    confidence = max_prob.item()
+    predicted_class = class_labels[predicted.item()]
 
-        with torch.no_grad():
-            outputs = model(image_tensor)
-            probabilities = torch.nn.functional.softmax(outputs, dim=1)
-            max_prob, predicted = torch.max(probabilities, 1)
+    logger.info(f"Model predicted {predicted_class} with confidence {confidence}")
+    return predicted_class, confidence
 
-            confidence = max_prob.item()
-            predicted_class = class_labels[predicted.item()]
+def _to_prediction_with_embedding(output):
+    probabilities, embedding = output
+    predicted_class, confidence = _to_prediction(probabilities)
+    return predicted_class, confidence, embedding.numpy() if embedding is not None else None
 
-            logger.info(f"Model predicted {predicted_class} with confidence {confidence}")
-            return predicted_class, confidence
+def predict_food_from_image(image):
+    predicted_class, confidence, _ = predict_food_with_embedding(image)
+    return predicted_class, confidence
+
+def predict_food_with_embedding(image):
+    """
+    Classify an image and return its penultimate-layer embedding as well
+
+    Returns:
+        (predicted_class, confidence, embedding) where embedding is a 1-D
+        numpy array, or None if the backend does not expose embeddings
+    """
+    try:
+        init_model()
+        return _to_prediction_with_embedding(get_batcher().infer(_preprocess(image)))
     except Exception as e:
         logger.error(f"Error in model prediction: {str(e)}")
-        return None, 0.0
\ No newline at end of file
+        return None, 0.0, None
+
+def predict_foods_from_images(images):
+    """
+    Classify several images together
+
+    All images are queued on the batcher at once, so they run as a single
+    batch (split only at INFERENCE_MAX_BATCH_SIZE). A failure on one image
+    does not affect the others.
+
+    Args:
+        images: List of PIL Images
+
+    Returns:
+        List of (predicted_class, confidence, embedding) tuples in input
+        order, as returned by predict_food_with_embedding; (None, 0.0, None)
+        for images that could not be classified
+    """
+    if not images:
+        return []
+    try:
+        init_model()
+    except Exception as e:
+        logger.error(f"Error loading model: {str(e)}")
+        return [(None, 0.0, None)] * len(images)
+
+    futures = []
+    for image in images:
+        try:
+            futures.append(get_batcher().submit(_preprocess(image)))
+        except Exception as e:
+            logger.error(f"Error preprocessing image: {str(e)}")
+            futures.append(None)
+
+    predictions = []
+    for future in futures:
+        try:
+            predictions.append(_to_prediction_with_embedding(future.result()) if future else (None, 0.0, None))
+        except Exception as e:
+            logger.error(f"Error in model prediction: {str(e)}")
+            predictions.append((None, 0.0, None))
+    return predictions
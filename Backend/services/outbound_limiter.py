@@ -0,0 +1,300 @@
+import time
+import logging
+import threading
+import requests
+from config import OUTBOUND_LIMITS, OUTBOUND_BREAKER_FAILURES, OUTBOUND_BREAKER_RESET_SECONDS
+from utils.metrics import LatencyRecorder
+
+logger = logging.getLogger(__name__)
+
+class UpstreamRejected(Exception):
+    """
+    Raised when a call is shed before reaching the upstream
+
+    Attributes:
+        upstream: Name of the upstream
+        reason: 'circuit_open', 'queue_full' or 'deadline'
+    """
+
+    def __init__(self, upstream, reason):
+        super().__init__(f"{upstream} is overloaded ({reason}); try again shortly")
+        self.upstream = upstream
+        self.reason = reason
+
+class TokenBucket:
+    """
+    Token bucket refilled at rate tokens per second, holding at most burst tokens
+
+    reserve() always takes a token, letting the balance go negative, and
+    returns how long the caller has to wait for it; cancel() gives it back.
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self):
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens -= 1
+            return max(0.0, -self._tokens / self.rate)
+
+    def cancel(self):
+        with self._lock:
+            self._tokens = min(self.burst, self._tokens + 1)
+
+    def available(self):
+        with self._lock:
+            self._refill(time.monotonic())
+            return round(self._tokens, 2)
+
+class CircuitBreaker:
+    """
+    Opens after failure_threshold consecutive failures and rejects calls for
+    reset_timeout seconds, then lets a single trial call through (half-open)
+    that closes it again on success
+
+    allow() tells the caller whether it holds the trial, and only the trial's
+    outcome moves the breaker out of half-open; calls admitted before the
+    circuit opened that finish later are ignored until it closes again.
+    """
+
+    def __init__(self, name, failure_threshold, reset_timeout):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.state = 'closed'
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """
+        Returns:
+            (allowed, trial) where trial is True for the half-open trial call
+        """
+        with self._lock:
+            if self.state == 'open' and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = 'half_open'
+            if self.state == 'closed':
+                return True, False
+            if self.state == 'half_open' and not self._trial_running:
+                self._trial_running = True
+                return True, True
+            return False, False
+
+    def abandon(self, trial):
+        """
+        Give back the trial taken by allow() when the call never happened
+        """
+        if trial:
+            with self._lock:
+                self._trial_running = False
+
+    def record_success(self, trial):
+        with self._lock:
+            if trial:
+                self._trial_running = False
+                self.state = 'closed'
+            if self.state == 'closed':
+                self._failures = 0
+
+    def record_failure(self, trial):
+        with self._lock:
+            if trial:
+                self._trial_running = False
+            elif self.state != 'closed':
+                return
+            self._failures += 1
+            if trial or self._failures >= self.failure_threshold:
+                if self.state != 'open':
+                    logger.warning(f"{self.name} circuit opened after {self._failures} consecutive failures")
+                self.state = 'open'
+                self._opened_at = time.monotonic()
+
+def is_upstream_failure(error):
+    """
+    Whether an exception says the upstream is unhealthy (rather than the request being bad)
+
+    Only connection errors, timeouts and 5xx/429 responses count. Callers
+    whose client library wraps these in its own exceptions mark them with
+    slot.fail().
+    """
+    if isinstance(error, (requests.ConnectionError, requests.Timeout)):
+        return True
+    status = getattr(getattr(error, 'response', None), 'status_code', None)
+    return status is not None and (status >= 500 or status == 429)
+
+class _Slot:
+    def __init__(self, limiter, trial):
+        self.limiter = limiter
+        self.trial = trial
+        self.failed = False
+
+    def fail(self):
+        """
+        Count this call as an upstream failure even though it did not raise
+        """
+        self.failed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if self.failed or (exc is not None and is_upstream_failure(exc)):
+            self.limiter.release(True, self.trial)
+        else:
+            # Any other exception (e.g. input validation) says nothing about the upstream
+            self.limiter.release(None if exc is not None else False, self.trial)
+        return False
+
+class OutboundLimiter:
+    """
+    Admission control for calls to one external service
+
+    A call first has to pass the circuit breaker, then get one of
+    max_in_flight slots, waiting in a queue of at most max_queue
+    callers, then a token from the rate limiter. Calls that would wait past
+    their deadline (queue_timeout seconds by default) are shed immediately
+    with UpstreamRejected instead of piling up behind a slow or rate-limited
+    upstream.
+
+    Args:
+        name: Upstream name used in errors, logs and stats
+        rate: Calls per second allowed on average (0 disables rate limiting)
+        burst: Calls allowed back to back after an idle period
+        max_in_flight: Maximum concurrent calls
+        max_queue: Maximum callers waiting for a slot
+        queue_timeout: Default seconds a caller may wait before being shed
+        failure_threshold: Consecutive failures that open the circuit
+        reset_timeout: Seconds the circuit stays open before a trial call
+    """
+
+    def __init__(self, name, rate, burst, max_in_flight, max_queue, queue_timeout,
+                 failure_threshold=OUTBOUND_BREAKER_FAILURES, reset_timeout=OUTBOUND_BREAKER_RESET_SECONDS):
+        self.name = name
+        self.max_in_flight = max(1, int(max_in_flight))
+        self.max_queue = max(0, int(max_queue))
+        self.queue_timeout = queue_timeout
+        self.bucket = TokenBucket(rate, burst)
+        self.breaker = CircuitBreaker(name, failure_threshold, reset_timeout)
+        self.wait_metrics = LatencyRecorder(f'{name}_admission_wait')
+        self._in_flight = 0
+        self._waiting = 0
+        self._condition = threading.Condition()
+
+    def _reject(self, reason):
+        self.wait_metrics.increment(f'rejected_{reason}')
+        raise UpstreamRejected(self.name, reason)
+
+    def slot(self, timeout=None):
+        """
+        Wait for permission to call the upstream
+
+        Use as a context manager around the call; leaving it with an upstream
+        failure (see is_upstream_failure) or after slot.fail() counts against
+        the circuit breaker, any other exception leaves the breaker as it is.
+
+        Args:
+            timeout: Seconds this caller may wait, defaults to queue_timeout
+
+        Raises:
+            UpstreamRejected: If the circuit is open, the queue is full or the deadline would pass
+        """
+        start = time.monotonic()
+        deadline = start + (self.queue_timeout if timeout is None else timeout)
+
+        allowed, trial = self.breaker.allow()
+        if not allowed:
+            self._reject('circuit_open')
+        try:
+            self._admit(deadline)
+        except UpstreamRejected:
+            self.breaker.abandon(trial)
+            raise
+
+        self.wait_metrics.record((time.monotonic() - start) * 1000, 'admitted')
+        return _Slot(self, trial)
+
+    def _admit(self, deadline):
+        with self._condition:
+            if self._in_flight >= self.max_in_flight or self._waiting:
+                if self._waiting >= self.max_queue:
+                    self._reject('queue_full')
+                self._waiting += 1
+                try:
+                    while self._in_flight >= self.max_in_flight:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self._reject('deadline')
+                        self._condition.wait(remaining)
+                finally:
+                    self._waiting -= 1
+            self._in_flight += 1
+
+        delay = self.bucket.reserve()
+        if time.monotonic() + delay > deadline:
+            self.bucket.cancel()
+            self._free()
+            self._reject('deadline')
+        if delay:
+            time.sleep(delay)
+
+    def _free(self):
+        with self._condition:
+            self._in_flight -= 1
+            self._condition.notify()
+
+    def release(self, failed, trial=False):
+        """
+        Free a slot; failed=None releases without reporting an outcome
+
+        trial says whether the slot holds the circuit breaker's half-open trial.
+        """
+        self._free()
+        if failed is None:
+            self.breaker.abandon(trial)
+        elif failed:
+            self.breaker.record_failure(trial)
+            self.wait_metrics.increment('upstream_failures')
+        else:
+            self.breaker.record_success(trial)
+
+    def call(self, function, *args, timeout=None, **kwargs):
+        """
+        Run function(*args, **kwargs) once admitted
+        """
+        with self.slot(timeout):
+            return function(*args, **kwargs)
+
+    def stats(self):
+        with self._condition:
+            in_flight, waiting = self._in_flight, self._waiting
+        return {
+            'in_flight': in_flight,
+            'max_in_flight': self.max_in_flight,
+            'queue_depth': waiting,
+            'max_queue': self.max_queue,
+            'tokens': self.bucket.available(),
+            'rate': self.bucket.rate,
+            'circuit': self.breaker.state,
+            'admission': self.wait_metrics.stats()
+        }
+
+outbound_limiters = {
+    name: OutboundLimiter(name, **limits)
+    for name, limits in OUTBOUND_LIMITS.items()
+}
+
+def get_limiter(name):
+    return outbound_limiters[name]
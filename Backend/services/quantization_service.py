@@ -0,0 +1,104 @@
+import os
+import logging
+import torch
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+QUANTIZATION_MODES = ('none', 'dynamic', 'static')
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.bmp')
+
+def load_calibration_tensors(directory, transform, limit=32):
+    """
+    Load and preprocess sample images used to calibrate static quantization
+
+    Args:
+        directory: Directory containing sample images (e.g. 'uploads')
+        transform: Preprocessing transform applied to each image
+        limit: Maximum number of images to load (default: 32)
+
+    Returns:
+        List of preprocessed image tensors
+    """
+    tensors = []
+    if not os.path.isdir(directory):
+        logger.warning(f"Calibration directory '{directory}' does not exist")
+        return tensors
+
+    for filename in sorted(os.listdir(directory)):
+        if len(tensors) >= limit:
+            break
+        if not filename.lower().endswith(IMAGE_EXTENSIONS):
+            continue
+        try:
+            with Image.open(os.path.join(directory, filename)) as image:
+                tensors.append(transform(image.convert('RGB')))
+        except Exception as e:
+            logger.warning(f"Skipping calibration image {filename}: {str(e)}")
+
+    logger.info(f"Loaded {len(tensors)} calibration images from {directory}")
+    return tensors
+
+def quantize_dynamic(model):
+    """
+    Apply dynamic INT8 quantization
+
+    Only Linear layers are quantized this way, so for EfficientNet this covers
+    the classifier head and leaves the convolutions in fp32.
+    """
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+def quantize_static(model, calibration_tensors, batch_size=8):
+    """
+    Apply static post-training INT8 quantization using FX graph mode
+
+    Args:
+        model: fp32 model in eval mode on CPU
+        calibration_tensors: Preprocessed sample images used to collect activation ranges
+        batch_size: Batch size used for calibration passes
+
+    Returns:
+        Quantized model
+    """
+    from torch.ao.quantization import get_default_qconfig_mapping
+    from torch.ao.quantization.quantize_fx import prepare_fx, convert_fx
+
+    if not calibration_tensors:
+        raise ValueError("Static quantization needs at least one calibration image")
+
+    example_inputs = (calibration_tensors[0].unsqueeze(0),)
+    prepared = prepare_fx(model, get_default_qconfig_mapping('x86'), example_inputs)
+
+    with torch.no_grad():
+        for start in range(0, len(calibration_tensors), batch_size):
+            prepared(torch.stack(calibration_tensors[start:start + batch_size]))
+
+    return convert_fx(prepared)
+
+def quantize_model(model, mode, calibration_tensors=None):
+    """
+    Quantize a loaded fp32 model for CPU inference
+
+    Args:
+        model: fp32 model in eval mode
+        mode: One of 'none', 'dynamic' or 'static'
+        calibration_tensors: Sample images, required for 'static'
+
+    Returns:
+        The quantized model, or the original model for mode 'none'
+    """
+    if mode not in QUANTIZATION_MODES:
+        raise ValueError(f"Unknown quantization mode '{mode}', expected one of {QUANTIZATION_MODES}")
+
+    if mode == 'none':
+        return model
+
+    model = model.to('cpu').eval()
+    if mode == 'dynamic':
+        quantized = quantize_dynamic(model)
+    else:
+        quantized = quantize_static(model, calibration_tensors)
+
+    logger.info(f"Model quantized to INT8 ({mode})")
+    return quantized.eval()
@@ -0,0 +1,145 @@
+import logging
+from config import RECIPE_STORE_ENABLED, SIMILARITY_INDEX_ENABLED, CANONICAL_RECIPE_MIN_CONFIDENCE
+from services.gemini_service import get_recipe_from_image, get_recipe_for_class
+from services.recipe_store import recipe_store
+from services.similarity_index import similarity_index
+from services.servings_scaler import scale_recipe
+from services.allergen_service import make_recipe_safe
+
+logger = logging.getLogger(__name__)
+
+def adapt_recipe(recipe_data, from_servings, servings, allergies):
+    """
+    Make a recipe safe for the allergies and scale it to the servings, locally
+
+    Returns:
+        Recipe data, or None if the recipe cannot be made safe locally
+    """
+    recipe_data = make_recipe_safe(recipe_data, allergies)
+    if recipe_data is None:
+        return None
+    return scale_recipe(recipe_data, from_servings, servings)
+
+def get_canonical_recipe(predicted_class, servings, allergies):
+    """
+    Precomputed recipe for a class, adapted to the requested servings and allergies
+
+    Returns:
+        Recipe data, or None if there is none or it cannot be made safe locally
+    """
+    recipe_data, canonical_servings = recipe_store.get_canonical(predicted_class)
+    if recipe_data is None:
+        return None
+    return adapt_recipe(recipe_data, canonical_servings, servings, allergies)
+
+def find_local_recipe(predicted_class, servings, allergies, confidence=None):
+    """
+    Get the recipe for a model-identified dish without calling Gemini
+
+    Tries the precomputed canonical recipe (if the classifier is confident),
+    then the recipe store (rescaling a recipe stored for other servings, or
+    rewriting one stored without allergies, locally).
+
+    Args:
+        predicted_class: Class predicted by the model
+        servings: Number of servings
+        allergies: List of allergies
+        confidence: Classifier confidence (optional)
+
+    Returns:
+        Recipe data, or None if Gemini has to generate it
+    """
+    if RECIPE_STORE_ENABLED and confidence is not None and confidence >= CANONICAL_RECIPE_MIN_CONFIDENCE:
+        recipe_data = get_canonical_recipe(predicted_class, servings, allergies)
+        if recipe_data is not None:
+            logger.info(f"Serving precomputed recipe for {predicted_class}")
+            return recipe_data
+
+    if RECIPE_STORE_ENABLED:
+        recipe_data = recipe_store.get(predicted_class, servings, allergies)
+        if recipe_data is not None:
+            logger.info(f"Serving stored recipe for {predicted_class} ({servings} servings)")
+            return recipe_data
+
+        recipe_data, stored_servings = recipe_store.get_any_servings(predicted_class, allergies)
+        if recipe_data is not None:
+            logger.info(f"Scaling stored {predicted_class} recipe from {stored_servings} to {servings} servings")
+            recipe_data = scale_recipe(recipe_data, stored_servings, servings)
+            recipe_store.put(predicted_class, servings, allergies, recipe_data)
+            return recipe_data
+
+        if allergies:
+            base_recipe, stored_servings = recipe_store.get_any_servings(predicted_class, [])
+            recipe_data = adapt_recipe(base_recipe, stored_servings, servings, allergies) if base_recipe else None
+            if recipe_data is not None:
+                logger.info(f"Substituted allergens locally in stored {predicted_class} recipe")
+                recipe_store.put(predicted_class, servings, allergies, recipe_data)
+                return recipe_data
+
+    return None
+
+def remember_recipe(predicted_class, servings, allergies, recipe_data):
+    """
+    Keep a recipe Gemini generated for a model-identified dish for later uploads
+    """
+    if RECIPE_STORE_ENABLED:
+        recipe_store.put(predicted_class, servings, allergies, recipe_data)
+
+def find_similar_recipe(embedding, predicted_class, servings, allergies):
+    """
+    Get the recipe Gemini identified for a near-duplicate of a photo whose prediction is not trusted
+
+    The untrusted predicted class must still match the near-duplicate's.
+
+    Returns:
+        Recipe data, or None if there is no similar enough photo
+    """
+    if not SIMILARITY_INDEX_ENABLED or embedding is None:
+        return None
+    recipe_data, similarity = similarity_index.query(embedding, predicted_class, servings, allergies)
+    if recipe_data is not None:
+        logger.info(f"Reusing recipe of a similar photo (similarity {similarity:.3f})")
+    return recipe_data
+
+def remember_similar_recipe(embedding, predicted_class, servings, allergies, recipe_data):
+    """
+    Keep a recipe Gemini identified from a photo for near-duplicate uploads
+    """
+    if SIMILARITY_INDEX_ENABLED and embedding is not None:
+        similarity_index.add(embedding, predicted_class, servings, allergies, recipe_data)
+
+def resolve_recipe(image_data, predicted_class, use_prediction, servings, allergies, embedding=None,
+                   confidence=None):
+    """
+    Get the recipe for an upload, avoiding Gemini calls where possible
+
+    When the model prediction is used, the recipe only depends on the dish,
+    servings and allergies: it is served locally by find_local_recipe where
+    possible, and only then generated by Gemini without uploading the image.
+    Otherwise Gemini identifies the dish from the image, unless a
+    near-duplicate photo was identified before.
+
+    Args:
+        image_data: Binary image data
+        predicted_class: Class predicted by the model
+        use_prediction: Whether the prediction is trusted for this upload
+        servings: Number of servings
+        allergies: List of allergies
+        embedding: Image embedding from the classifier (optional)
+        confidence: Classifier confidence (optional)
+
+    Returns:
+        Recipe data in JSON format
+    """
+    if not use_prediction:
+        recipe_data = find_similar_recipe(embedding, predicted_class, servings, allergies)
+        if recipe_data is None:
+            recipe_data = get_recipe_from_image(image_data, None, servings, allergies)
+            remember_similar_recipe(embedding, predicted_class, servings, allergies, recipe_data)
+        return recipe_data
+
+    recipe_data = find_local_recipe(predicted_class, servings, allergies, confidence)
+    if recipe_data is None:
+        recipe_data = get_recipe_for_class(predicted_class, servings, allergies)
+        remember_recipe(predicted_class, servings, allergies, recipe_data)
+    return recipe_data
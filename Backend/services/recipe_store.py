@@ -0,0 +1,178 @@
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from config import RECIPE_STORE_ENABLED, RECIPE_STORE_PATH, RECIPE_STORE_TTL_SECONDS, RECIPE_STORE_MAX_ENTRIES
+from utils.helpers import normalize_allergies
+
+logger = logging.getLogger(__name__)
+
+def make_recipe_key(predicted_class, servings, allergies):
+    return f"{predicted_class.lower()}|{servings}|{','.join(normalize_allergies(allergies))}"
+
+class RecipeStore:
+    """
+    Persistent recipe store keyed on (predicted class, servings, allergy set)
+
+    Backed by SQLite in WAL mode, so the store survives restarts and is
+    shared by every worker process pointing at the same file. Entries expire
+    ttl_seconds after they were stored, and once more than max_entries are
+    kept the least recently used ones are evicted.
+
+    A separate table holds one canonical recipe per class, written by the
+    offline precompute job (scripts/precompute_recipes.py). Canonical recipes
+    never expire and are not counted against max_entries.
+
+    Args:
+        path: SQLite database file, or ':memory:'
+        ttl_seconds: Seconds an entry stays valid
+        max_entries: Maximum number of entries kept
+    """
+
+    def __init__(self, path, ttl_seconds, max_entries):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max(1, int(max_entries))
+        self.hits = 0
+        self.misses = 0
+        self.canonical_hits = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path) if path != ':memory:' else ''
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS recipes (
+                key TEXT PRIMARY KEY,
+                predicted_class TEXT NOT NULL,
+                servings INTEGER NOT NULL,
+                allergies TEXT NOT NULL,
+                recipe TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        self._connection.execute("CREATE INDEX IF NOT EXISTS recipes_last_access ON recipes (last_access)")
+        self._connection.execute("CREATE INDEX IF NOT EXISTS recipes_class ON recipes (predicted_class, allergies)")
+        self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS canonical_recipes (
+                predicted_class TEXT PRIMARY KEY,
+                servings INTEGER NOT NULL,
+                recipe TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+        """)
+
+    def get(self, predicted_class, servings, allergies):
+        key = make_recipe_key(predicted_class, servings, allergies)
+        now = time.time()
+
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT recipe, created_at FROM recipes WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or row[1] + self.ttl_seconds < now:
+                if row is not None:
+                    self._connection.execute("DELETE FROM recipes WHERE key = ?", (key,))
+                self.misses += 1
+                return None
+
+            self._connection.execute("UPDATE recipes SET last_access = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            return json.loads(row[0])
+
+    def get_any_servings(self, predicted_class, allergies):
+        """
+        Most recently used recipe for a class and allergy set, at whatever servings it was stored
+
+        Returns:
+            (recipe, servings), or (None, None)
+        """
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT recipe, servings FROM recipes WHERE predicted_class = ? AND allergies = ? AND created_at >= ? "
+                "ORDER BY last_access DESC LIMIT 1",
+                (predicted_class, ','.join(normalize_allergies(allergies)), time.time() - self.ttl_seconds)
+            ).fetchone()
+        if row is None:
+            return None, None
+        return json.loads(row[0]), row[1]
+
+    def put(self, predicted_class, servings, allergies, recipe):
+        key = make_recipe_key(predicted_class, servings, allergies)
+        now = time.time()
+
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO recipes VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, predicted_class, servings, ','.join(normalize_allergies(allergies)),
+                 json.dumps(recipe, separators=(',', ':')), now, now)
+            )
+            self._connection.execute(
+                "DELETE FROM recipes WHERE key IN ("
+                "SELECT key FROM recipes ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+
+    def get_canonical(self, predicted_class):
+        """
+        Returns:
+            (recipe, servings) of the canonical recipe for a class, or (None, None)
+        """
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT recipe, servings FROM canonical_recipes WHERE predicted_class = ?",
+                (predicted_class.lower(),)
+            ).fetchone()
+        if row is None:
+            return None, None
+        self.canonical_hits += 1
+        return json.loads(row[0]), row[1]
+
+    def put_canonical(self, predicted_class, servings, recipe):
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO canonical_recipes VALUES (?, ?, ?, ?)",
+                (predicted_class.lower(), servings, json.dumps(recipe, separators=(',', ':')), time.time())
+            )
+
+    def canonical_classes(self):
+        with self._lock:
+            rows = self._connection.execute("SELECT predicted_class FROM canonical_recipes").fetchall()
+        return {row[0] for row in rows}
+
+    def purge_expired(self):
+        with self._lock:
+            cursor = self._connection.execute(
+                "DELETE FROM recipes WHERE created_at < ?", (time.time() - self.ttl_seconds,)
+            )
+            return cursor.rowcount
+
+    def size(self):
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM recipes").fetchone()[0]
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'enabled': RECIPE_STORE_ENABLED,
+            'size': self.size(),
+            'max_entries': self.max_entries,
+            'ttl_seconds': self.ttl_seconds,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            'canonical_recipes': len(self.canonical_classes()),
+            'canonical_hits': self.canonical_hits
+        }
+
+recipe_store = RecipeStore(
+    RECIPE_STORE_PATH if RECIPE_STORE_ENABLED else ':memory:',
+    RECIPE_STORE_TTL_SECONDS,
+    RECIPE_STORE_MAX_ENTRIES
+)
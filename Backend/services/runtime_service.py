@@ -0,0 +1,115 @@
+import os
+import logging
+import torch
+
+logger = logging.getLogger(__name__)
+
+def parse_cpu_list(spec):
+    """
+    Parse a Linux-style CPU list such as '0-3,8,10-11'
+
+    Returns:
+        Sorted list of CPU ids, empty for an empty spec
+    """
+    cpus = set()
+    for part in (spec or '').split(','):
+        part = part.strip()
+        if not part:
+            continue
+        if '-' in part:
+            start, end = part.split('-', 1)
+            cpus.update(range(int(start), int(end) + 1))
+        else:
+            cpus.add(int(part))
+    return sorted(cpus)
+
+def available_cpus():
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+def worker_cpu_slice(cpus, workers, index):
+    """
+    The contiguous share of cpus for worker number index out of workers
+
+    Workers get disjoint slices when there are at least as many CPUs as
+    workers; otherwise they are spread one CPU each, round robin.
+    """
+    workers = max(1, workers)
+    if len(cpus) < workers:
+        return [cpus[index % len(cpus)]]
+    return cpus[index * len(cpus) // workers:(index + 1) * len(cpus) // workers]
+
+def thread_budget(num_threads, workers_per_host, cpus):
+    """
+    Number of intra-op threads for this process
+
+    An explicit num_threads wins; otherwise the CPUs this process may run on
+    are split evenly between the workers sharing the host.
+    """
+    if num_threads > 0:
+        return num_threads
+    return max(1, len(cpus) // max(1, workers_per_host))
+
+def configure_torch_runtime(num_threads=0, interop_threads=1, workers_per_host=1, cpu_affinity='',
+                            worker_index=None):
+    """
+    Apply thread and CPU affinity settings for this process and log the result
+
+    Must run before the first forward pass, since torch fixes its inter-op
+    pool once parallel work has started.
+
+    Args:
+        num_threads: Intra-op threads; 0 to split the available CPUs between workers
+        interop_threads: Inter-op threads; 0 to keep the torch default
+        workers_per_host: Number of processes running inference on this host
+        cpu_affinity: CPU list shared by the workers (e.g. '0-7'); empty to leave unpinned
+        worker_index: This worker's index (0 to workers_per_host - 1); when set with
+            cpu_affinity, the worker is pinned to its own slice of the list
+
+    Returns:
+        Dictionary describing the effective topology
+    """
+    cpus = parse_cpu_list(cpu_affinity)
+    sliced = bool(cpus) and worker_index is not None
+    if sliced:
+        cpus = worker_cpu_slice(cpus, workers_per_host, worker_index)
+    if cpus:
+        if hasattr(os, 'sched_setaffinity'):
+            os.sched_setaffinity(0, cpus)
+        else:
+            logger.warning("CPU affinity is not supported on this platform; ignoring CPU_AFFINITY")
+
+    # A worker pinned to its own slice uses all of it; otherwise the CPUs are shared by every worker
+    torch.set_num_threads(thread_budget(num_threads, 1 if sliced else workers_per_host, available_cpus()))
+    if interop_threads > 0:
+        try:
+            torch.set_num_interop_threads(interop_threads)
+        except RuntimeError as e:
+            logger.warning(f"Could not set inter-op threads: {str(e)}")
+
+    topology = describe_topology()
+    topology['workers_per_host'] = workers_per_host
+    topology['worker_index'] = worker_index
+    logger.info(f"Torch runtime topology: {topology}")
+    return topology
+
+def cpu_supports_bf16():
+    """
+    Whether this CPU has native bfloat16 support for oneDNN kernels
+    """
+    try:
+        return torch.backends.mkldnn.is_available() and torch.ops.mkldnn._is_mkldnn_bf16_supported()
+    except (AttributeError, RuntimeError):
+        return False
+
+def describe_topology():
+    cpu_capability = torch.backends.cpu.get_cpu_capability() if hasattr(torch.backends, 'cpu') else 'unknown'
+    return {
+        'pid': os.getpid(),
+        'host_cpus': os.cpu_count(),
+        'affinity': available_cpus(),
+        'intra_op_threads': torch.get_num_threads(),
+        'inter_op_threads': torch.get_num_interop_threads(),
+        'cpu_capability': cpu_capability
+    }
@@ -0,0 +1,241 @@
+import re
+import copy
+import logging
+from fractions import Fraction
+
+logger = logging.getLogger(__name__)
+
+UNICODE_FRACTIONS = {
+    '¼': Fraction(1, 4), '½': Fraction(1, 2), '¾': Fraction(3, 4),
+    '⅓': Fraction(1, 3), '⅔': Fraction(2, 3), '⅛': Fraction(1, 8)
+}
+
+# Canonical unit -> spellings; volume and count-like units are rendered as
+# kitchen fractions, weights and liquids as rounded metric amounts
+UNITS = {
+    'cup': ['cups', 'cup'],
+    'tbsp': ['tablespoons', 'tablespoon', 'tbsps', 'tbsp', 'tbs'],
+    'tsp': ['teaspoons', 'teaspoon', 'tsps', 'tsp'],
+    'katori': ['katoris', 'katori', 'bowls', 'bowl'],
+    'glass': ['glasses', 'glass'],
+    'pinch': ['pinches', 'pinch'],
+    'clove': ['cloves', 'clove'],
+    'bunch': ['bunches', 'bunch'],
+    'sprig': ['sprigs', 'sprig'],
+    'slice': ['slices', 'slice'],
+    'kg': ['kilograms', 'kilogram', 'kgs', 'kg'],
+    'g': ['grams', 'gram', 'gms', 'gm', 'g'],
+    'l': ['litres', 'litre', 'liters', 'liter', 'ltr', 'l'],
+    'ml': ['millilitres', 'millilitre', 'milliliters', 'milliliter', 'ml']
+}
+METRIC_UNITS = {'kg', 'g', 'l', 'ml'}
+# Unit words that change with the amount ('1 cup', '2 cups'); abbreviations are kept as written
+UNIT_PLURALS = {
+    'cup': 'cups', 'tablespoon': 'tablespoons', 'teaspoon': 'teaspoons', 'katori': 'katoris', 'bowl': 'bowls',
+    'glass': 'glasses', 'pinch': 'pinches', 'clove': 'cloves', 'bunch': 'bunches', 'sprig': 'sprigs',
+    'slice': 'slices', 'kilogram': 'kilograms', 'gram': 'grams', 'litre': 'litres', 'liter': 'liters',
+    'millilitre': 'millilitres', 'milliliter': 'milliliters'
+}
+UNIT_SINGULARS = {plural: singular for singular, plural in UNIT_PLURALS.items()}
+IRREGULAR_PLURALS = {'leaf': 'leaves', 'half': 'halves'}
+IRREGULAR_SINGULARS = {plural: singular for singular, plural in IRREGULAR_PLURALS.items()}
+# Words that end the counted noun phrase in '1 onion cut into rings'
+NOUN_PHRASE_STOP_WORDS = {'cut', 'into', 'and', 'or', 'for', 'to', 'of', 'with', 'as', 'in', 'per', 'at'}
+KITCHEN_FRACTIONS = [Fraction(n, d) for n, d in [(0, 1), (1, 8), (1, 4), (1, 3), (1, 2), (2, 3), (3, 4), (1, 1)]]
+
+_UNIT_LOOKUP = {spelling: unit for unit, spellings in UNITS.items() for spelling in spellings}
+_NUMBER = r'(?:\d+\s+\d+/\d+|\d+\s*[¼½¾⅓⅔⅛]|\d+/\d+|\d+(?:\.\d+)?|[¼½¾⅓⅔⅛])'
+QUANTITY_PATTERN = re.compile(
+    rf'(?<![\w/.])(?P<low>{_NUMBER})(?:\s*(?:-|–|to)\s*(?P<high>{_NUMBER}))?'
+    rf'(?:\s*(?P<unit>{"|".join(sorted(_UNIT_LOOKUP, key=len, reverse=True))})\.?(?![a-zA-Z]))?',
+    re.IGNORECASE
+)
+
+def parse_number(text):
+    """
+    Parse '2', '1.5', '1/2', '1 1/2', '1½' or '½' into a Fraction
+    """
+    text = text.strip()
+    if text[-1] in UNICODE_FRACTIONS:
+        whole = text[:-1].strip()
+        return (Fraction(whole) if whole else 0) + UNICODE_FRACTIONS[text[-1]]
+    if ' ' in text:
+        whole, part = text.split(None, 1)
+        return Fraction(whole) + Fraction(part)
+    return Fraction(text)
+
+LINE_START = re.compile(r'\s*(?:[-*•]\s*)?')
+
+def find_quantities(text, counts=True):
+    """
+    Find the quantities to scale in a line of text
+
+    A number is a quantity when it has a unit ('2 cups', '(250 ml)') or, with
+    counts=True, when it starts the line ('2 onions'). Other numbers, such as
+    the one in 'Chicken 65' or '2 inch pieces', are left alone.
+
+    Args:
+        text: Ingredient or instruction text, e.g. '1 1/2 cups rice' or '2-3 green chillies'
+        counts: Whether a number at the start of the line counts without a unit
+
+    Returns:
+        List of (match, low, high, unit); high is None unless the quantity is
+        a range, unit is None for counts
+    """
+    line_start = LINE_START.match(text).end()
+    quantities = []
+    for match in QUANTITY_PATTERN.finditer(text):
+        if not match.group('unit') and not (counts and match.start() == line_start):
+            continue
+        low = parse_number(match.group('low'))
+        high = parse_number(match.group('high')) if match.group('high') else None
+        unit = _UNIT_LOOKUP.get(match.group('unit').lower()) if match.group('unit') else None
+        quantities.append((match, low, high, unit))
+    return quantities
+
+def format_amount(amount, unit):
+    """
+    Render a scaled amount the way a recipe would write it
+    """
+    if unit in METRIC_UNITS:
+        value = float(amount)
+        if value >= 20:
+            return str(int(round(value / 5) * 5))
+        return f'{value:.2f}'.rstrip('0').rstrip('.') if value < 10 else str(int(round(value)))
+
+    whole = int(amount)
+    part = min(KITCHEN_FRACTIONS, key=lambda fraction: abs(amount - whole - fraction))
+    if part == 1:
+        whole, part = whole + 1, 0
+    if whole == 0 and part == 0:
+        part = KITCHEN_FRACTIONS[1]
+    if part == 0:
+        return str(whole)
+    fraction = f'{part.numerator}/{part.denominator}'
+    return f'{whole} {fraction}' if whole else fraction
+
+def _match_case(word, original):
+    return word.capitalize() if original[:1].isupper() else word
+
+def inflect(word, amount):
+    """
+    Singular or plural form of a word for an amount ('1 egg', '2 eggs')
+
+    Unit words use UNIT_PLURALS; other words follow the common English
+    endings, and words already ending in 's' are taken to be plural.
+    """
+    lower = word.lower()
+    if amount > 1:
+        if lower in UNIT_PLURALS or lower in IRREGULAR_PLURALS:
+            plural = UNIT_PLURALS.get(lower) or IRREGULAR_PLURALS[lower]
+        elif lower in _UNIT_LOOKUP or lower.endswith('s'):
+            return word
+        elif lower.endswith(('ch', 'sh', 'x', 'o')):
+            plural = lower + 'es'
+        elif lower.endswith('y') and lower[-2:-1] not in 'aeiou':
+            plural = lower[:-1] + 'ies'
+        else:
+            plural = lower + 's'
+        return _match_case(plural, word)
+
+    if lower in UNIT_SINGULARS or lower in IRREGULAR_SINGULARS:
+        singular = UNIT_SINGULARS.get(lower) or IRREGULAR_SINGULARS[lower]
+    elif lower in _UNIT_LOOKUP:
+        return word
+    elif lower.endswith('ies'):
+        singular = lower[:-3] + 'y'
+    elif lower.endswith(('oes', 'ches', 'shes', 'xes')):
+        singular = lower[:-2]
+    elif lower.endswith('s') and not lower.endswith(('ss', 'us')):
+        singular = lower[:-1]
+    else:
+        return word
+    return _match_case(singular, word)
+
+def _counted_noun(text, start):
+    """
+    Span of the noun a leading count refers to: the last word of the phrase
+    after it ('2 green chillies, slit' -> 'chillies'), or None
+
+    Participles and adverbs end the phrase once a noun has been seen
+    ('2 onions sliced') and are skipped before one ('1 finely chopped onion').
+    """
+    noun = None
+    for word in re.finditer(r"[A-Za-z]+(?:-[A-Za-z]+)*|[^A-Za-z\s]", text[start:]):
+        value = word.group(0).lower()
+        if not value[0].isalpha() or value in NOUN_PHRASE_STOP_WORDS:
+            break
+        if value.endswith(('ed', 'ly')):
+            if noun is not None:
+                break
+            continue
+        noun = (start + word.start(), start + word.end())
+    return noun
+
+def scale_quantities(text, factor, counts=True):
+    """
+    Scale every quantity in one ingredient or instruction line
+
+    Unit words, and the noun after a leading count, are made singular or
+    plural to match the new amount. Lines without a quantity are returned
+    as is.
+
+    Args:
+        text: Line to scale
+        factor: Fraction to multiply every quantity by
+        counts: Whether a number at the start of the line counts without a unit (see find_quantities)
+    """
+    pieces = []
+    position = 0
+    for match, low, high, unit in find_quantities(text, counts):
+        amount = format_amount(low * factor, unit)
+        if high is not None:
+            separator = text[match.end('low'):match.start('high')]
+            amount = f'{amount}{separator}{format_amount(high * factor, unit)}'
+        new_amount = (high if high is not None else low) * factor
+        number_end = match.end('high') if high is not None else match.end('low')
+        pieces.append(f'{text[position:match.start()]}{amount}')
+
+        if unit is not None:
+            unit_text = match.group('unit')
+            pieces.append(f"{text[number_end:match.start('unit')]}{inflect(unit_text, new_amount)}")
+            position = match.end('unit')
+            continue
+        position = number_end
+        noun = _counted_noun(text, number_end)
+        if noun is not None:
+            pieces.append(f'{text[position:noun[0]]}{inflect(text[noun[0]:noun[1]], new_amount)}')
+            position = noun[1]
+    pieces.append(text[position:])
+    return ''.join(pieces)
+
+def scale_recipe(recipe_data, from_servings, to_servings):
+    """
+    Rescale a recipe generated for one serving count to another
+
+    Every quantity in the ingredients and every quantity with a unit in the
+    instructions is rewritten; times and the rest of the recipe are kept.
+    The copy records the servings the recipe was first generated for in
+    scaled_from, which is kept when a scaled recipe is scaled again.
+
+    Args:
+        recipe_data: Recipe data in JSON format
+        from_servings: Servings the recipe was generated for
+        to_servings: Servings to scale to
+
+    Returns:
+        A scaled copy of the recipe
+    """
+    if from_servings == to_servings:
+        return recipe_data
+
+    factor = Fraction(to_servings) / Fraction(from_servings)
+    scaled = copy.deepcopy(recipe_data)
+    for field, counts in (('ingredients', True), ('instructions', False)):
+        scaled[field] = [
+            scale_quantities(line, factor, counts) if isinstance(line, str) else line
+            for line in recipe_data.get(field, [])
+        ]
+    scaled['servings'] = str(to_servings)
+    scaled['scaled_from'] = recipe_data.get('scaled_from', str(from_servings))
+    return scaled
@@ -0,0 +1,193 @@
+import os
+import json
+import time
+import atexit
+import logging
+import threading
+from collections import OrderedDict
+import numpy as np
+from config import (
+    SIMILARITY_INDEX_ENABLED, SIMILARITY_INDEX_PATH, SIMILARITY_THRESHOLD,
+    SIMILARITY_INDEX_MAX_ENTRIES_PER_KEY, SIMILARITY_INDEX_MAX_PARTITIONS,
+    SIMILARITY_INDEX_SAVE_INTERVAL_SECONDS
+)
+from utils.helpers import normalize_allergies
+
+logger = logging.getLogger(__name__)
+
+INDEX_FORMAT_VERSION = 3
+
+def make_partition_key(predicted_class, servings, allergies):
+    return f"{predicted_class}|{servings}|{','.join(normalize_allergies(allergies))}"
+
+class EmbeddingIndex:
+    """
+    Nearest-neighbour index over image embeddings of uploads Gemini identified
+
+    It serves uploads whose predicted class is not trusted (low confidence or
+    force_mode=gemini), which the recipe store cannot key on. The model's top
+    class is still part of the partition key, so a photo only matches one the
+    classifier read the same way. Entries are partitioned by (predicted class,
+    servings, allergies), which acts as the coarse quantizer of an IVF index:
+    a query only scans the partition its recipe would have to match anyway,
+    with one vectorized cosine-similarity product. Embeddings are L2-normalized and
+    stored as float16. Each partition keeps at most max_entries_per_key
+    entries, dropping the oldest first, and at most max_partitions partitions
+    are kept, dropping the least recently used. The index is written to disk
+    at most every save_interval seconds and once more at exit.
+
+    Args:
+        path: File prefix for persistence ('<path>.npz' and '<path>.json'); None for memory only
+        threshold: Minimum cosine similarity for a match
+        max_entries_per_key: Maximum entries kept per partition
+        max_partitions: Maximum number of partitions kept
+        save_interval: Minimum seconds between writes to disk
+    """
+
+    def __init__(self, path=None, threshold=0.95, max_entries_per_key=256, max_partitions=32, save_interval=30):
+        self.path = path
+        self.threshold = threshold
+        self.max_entries_per_key = max(1, int(max_entries_per_key))
+        self.max_partitions = max(1, int(max_partitions))
+        self.save_interval = save_interval
+        self._vectors = OrderedDict()
+        self._recipes = {}
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._last_saved = time.monotonic()
+        self.hits = 0
+        self.misses = 0
+        if path:
+            self.load()
+            atexit.register(self.save)
+
+    @staticmethod
+    def _normalize(embedding):
+        vector = np.asarray(embedding, dtype=np.float32).reshape(-1)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def query(self, embedding, predicted_class, servings, allergies):
+        """
+        Find the stored recipe of the most similar image with the same predicted class, servings and allergies
+
+        Returns:
+            (recipe, similarity) for the best match above the threshold, or (None, best_similarity)
+        """
+        key = make_partition_key(predicted_class, servings, allergies)
+        vector = self._normalize(embedding)
+
+        with self._lock:
+            vectors = self._vectors.get(key)
+            if vectors is None or not len(vectors):
+                self.misses += 1
+                return None, 0.0
+
+            similarities = vectors.astype(np.float32) @ vector
+            best = int(np.argmax(similarities))
+            similarity = float(similarities[best])
+            if similarity < self.threshold:
+                self.misses += 1
+                return None, similarity
+
+            self.hits += 1
+            self._vectors.move_to_end(key)
+            return self._recipes[key][best], similarity
+
+    def add(self, embedding, predicted_class, servings, allergies, recipe):
+        key = make_partition_key(predicted_class, servings, allergies)
+        vector = self._normalize(embedding).astype(np.float16)
+
+        with self._lock:
+            vectors = self._vectors.get(key)
+            recipes = self._recipes.setdefault(key, [])
+            vectors = vector[None, :] if vectors is None else np.vstack([vectors, vector])
+            recipes.append(recipe)
+            if len(recipes) > self.max_entries_per_key:
+                vectors = vectors[-self.max_entries_per_key:]
+                del recipes[:-self.max_entries_per_key]
+            self._vectors[key] = vectors
+            self._vectors.move_to_end(key)
+            while len(self._vectors) > self.max_partitions:
+                evicted, _ = self._vectors.popitem(last=False)
+                del self._recipes[evicted]
+            self._dirty = True
+            due = time.monotonic() - self._last_saved >= self.save_interval
+
+        if self.path and due:
+            self.save()
+
+    def save(self):
+        with self._lock:
+            if not self.path or not self._dirty:
+                return
+            self._dirty = False
+            self._last_saved = time.monotonic()
+            keys = list(self._vectors)
+            arrays = {f'v{i}': self._vectors[key] for i, key in enumerate(keys)}
+            metadata = {
+                'version': INDEX_FORMAT_VERSION,
+                'keys': keys,
+                'recipes': [self._recipes[key] for key in keys]
+            }
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        try:
+            with open(f'{self.path}.npz.tmp', 'wb') as f:
+                np.savez(f, **arrays)
+            with open(f'{self.path}.json.tmp', 'w') as f:
+                json.dump(metadata, f)
+            os.replace(f'{self.path}.npz.tmp', f'{self.path}.npz')
+            os.replace(f'{self.path}.json.tmp', f'{self.path}.json')
+        except OSError as e:
+            self._dirty = True
+            logger.error(f"Error saving similarity index: {str(e)}")
+
+    def load(self):
+        if not (os.path.isfile(f'{self.path}.npz') and os.path.isfile(f'{self.path}.json')):
+            return
+        try:
+            with open(f'{self.path}.json') as f:
+                metadata = json.load(f)
+            if metadata.get('version') != INDEX_FORMAT_VERSION:
+                logger.info(f"Discarding similarity index at {self.path} written in an older format")
+                return
+            with np.load(f'{self.path}.npz') as arrays:
+                vectors = {key: arrays[f'v{i}'] for i, key in enumerate(metadata['keys'])}
+            recipes = dict(zip(metadata['keys'], metadata['recipes']))
+            if any(len(vectors[key]) != len(recipes[key]) for key in vectors):
+                raise ValueError("vector and recipe counts differ")
+        except Exception as e:
+            logger.error(f"Ignoring unreadable similarity index at {self.path}: {str(e)}")
+            return
+
+        with self._lock:
+            self._vectors = OrderedDict(vectors)
+            self._recipes = recipes
+        logger.info(f"Loaded similarity index with {self.size()} entries from {self.path}")
+
+    def size(self):
+        return sum(len(vectors) for vectors in self._vectors.values())
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'enabled': SIMILARITY_INDEX_ENABLED,
+                'partitions': len(self._vectors),
+                'size': self.size(),
+                'threshold': self.threshold,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+similarity_index = EmbeddingIndex(
+    SIMILARITY_INDEX_PATH if SIMILARITY_INDEX_ENABLED else None,
+    threshold=SIMILARITY_THRESHOLD,
+    max_entries_per_key=SIMILARITY_INDEX_MAX_ENTRIES_PER_KEY,
+    max_partitions=SIMILARITY_INDEX_MAX_PARTITIONS,
+    save_interval=SIMILARITY_INDEX_SAVE_INTERVAL_SECONDS
+)
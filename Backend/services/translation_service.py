@@ -1,11 +1,21 @@
 import io
+import time
 import base64
 import logging
 from gtts import gTTS
+from gtts.tts import gTTSError
 from deep_translator import GoogleTranslator
+from deep_translator.exceptions import TooManyRequests, RequestError
+from config import HEDGING_ENABLED
+from services.outbound_limiter import get_limiter
+from services.hedging import make_hedger
+from utils.metrics import LatencyRecorder
 
 logger = logging.getLogger(__name__)
 
+translate_metrics = LatencyRecorder('translate')
+translate_hedger = make_hedger('translate', translate_metrics) if HEDGING_ENABLED else None
+
 def get_indian_languages():
     """
     Return a dictionary of supported Indian languages
@@ -28,6 +38,23 @@ def get_indian_languages():
         'sa': 'Sanskrit'
     }
 
+def _translate(source, target, text):
+    start = time.perf_counter()
+    try:
+        translator = GoogleTranslator(source=source, target=target)
+        with get_limiter('translate').slot() as slot:
+            try:
+                translated_text = translator.translate(text)
+            except (TooManyRequests, RequestError):
+                # Google answered 429 or a non-2xx status
+                slot.fail()
+                raise
+    except Exception:
+        translate_metrics.record((time.perf_counter() - start) * 1000, 'error')
+        raise
+    translate_metrics.record((time.perf_counter() - start) * 1000, 'ok')
+    return translated_text
+
 def translate_text(text, target_language):
     """
     Translate text to the target language using Google Translator
@@ -43,8 +70,10 @@ def translate_text(text, target_language):
         }
         
         target = language_mapping.get(target_language, target_language)
-        translator = GoogleTranslator(source=source_language, target=target)
-        translated_text = translator.translate(text)
+        if translate_hedger is not None:
+            translated_text = translate_hedger.call(_translate, source_language, target, text)
+        else:
+            translated_text = _translate(source_language, target, text)
         
         return translated_text
     except Exception as e:
@@ -71,7 +100,15 @@ def text_to_speech(text, lang='en', translate=True):
             
         tts = gTTS(text=translated_text, lang=lang)
         mp3_fp = io.BytesIO()
-        tts.write_to_fp(mp3_fp)
+        with get_limiter('tts').slot() as slot:
+            try:
+                tts.write_to_fp(mp3_fp)
+            except gTTSError as e:
+                # No response means the connection failed
+                status = getattr(e.rsp, 'status_code', None)
+                if status is None or status >= 500 or status == 429:
+                    slot.fail()
+                raise
         mp3_fp.seek(0)
         
         return mp3_fp.getvalue(), translated_text
@@ -0,0 +1,46 @@
+from services.allergen_service import make_recipe_safe
+
+def make_recipe(*ingredients, instructions=()):
+    return {
+        'name': 'Test Dish',
+        'ingredients': list(ingredients),
+        'instructions': list(instructions),
+        'description': 'A test dish'
+    }
+
+def rewrite(line, allergies):
+    safe = make_recipe_safe(make_recipe(line), allergies)
+    assert safe is not None
+    return safe['ingredients'][0]
+
+def test_adjacent_allergen_terms_are_replaced_once():
+    assert rewrite('Cashew nuts', ['tree nuts']) == 'Pumpkin seeds'
+
+def test_known_forms_replace_the_whole_phrase():
+    assert rewrite('Almond flakes', ['tree nuts']) == 'Pumpkin seeds'
+    assert rewrite('Pistachio slivers, to garnish', ['tree nuts']) == 'Pumpkin seeds, to garnish'
+    assert rewrite('2 tbsp cashew paste', ['tree nuts']) == '2 tbsp melon seed paste'
+
+def test_coordinated_list_names_a_shared_substitute_once():
+    safe = make_recipe_safe(make_recipe(instructions=['Heat ghee and butter in a pan']), ['milk'])
+    assert safe['instructions'] == ['Heat vegetable oil in a pan']
+    assert rewrite('Ghee, paneer or butter', ['milk']) == 'Vegetable oil or tofu'
+
+def test_list_with_distinct_substitutes_keeps_its_separators():
+    assert rewrite('paneer and ghee', ['milk']) == 'tofu and vegetable oil'
+
+def test_phrase_level_term_substitute():
+    assert rewrite('1 tsp mustard seeds', ['mustard']) == '1 tsp cumin seeds'
+
+def test_form_without_a_substitute_falls_back_to_gemini():
+    assert make_recipe_safe(make_recipe('1 tbsp milk cream'), ['milk']) is None
+    assert make_recipe_safe(make_recipe('Walnut oil'), ['tree nuts']) is None
+
+def test_exception_phrases_are_left_alone():
+    assert rewrite('1 cup coconut milk', ['milk']) == '1 cup coconut milk'
+
+def test_substitutions_are_reported():
+    safe = make_recipe_safe(make_recipe('Cashew nuts'), ['tree nuts'])
+    assert safe['substitutions'] == [
+        {'allergen': 'tree nuts', 'original': 'cashew nuts', 'substitute': 'pumpkin seeds'}
+    ]
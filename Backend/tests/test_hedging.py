@@ -0,0 +1,58 @@
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from services.hedging import Hedger
+from utils.metrics import LatencyRecorder
+
+def make_recorder(latency_ms, samples=50):
+    recorder = LatencyRecorder('test')
+    for _ in range(samples):
+        recorder.record(latency_ms)
+    return recorder
+
+def slow_call():
+    time.sleep(0.005)
+    return 'ok'
+
+def test_concurrent_hedges_stay_within_budget():
+    # Every call is slow, so all of them reach the hedge decision together
+    release = threading.Event()
+
+    def blocked_call():
+        release.wait(5)
+        return 'ok'
+
+    hedger = Hedger('test', make_recorder(1), min_delay_ms=50, min_samples=1,
+                    budget_percent=5, max_workers=256, window=1000)
+    with ThreadPoolExecutor(max_workers=100) as pool:
+        futures = [pool.submit(hedger.call, blocked_call) for _ in range(100)]
+        time.sleep(0.5)
+        release.set()
+        results = [future.result() for future in futures]
+
+    assert results == ['ok'] * 100
+    stats = hedger.stats()
+    assert stats['calls'] == 100
+    assert 0 < stats['hedged'] <= 100 * 5 / 100
+    assert stats['hedged'] + stats['budget_exhausted'] == 100
+
+def test_budget_is_measured_over_the_window():
+    hedger = Hedger('test', make_recorder(1), min_delay_ms=1, min_samples=1,
+                    budget_percent=10, max_workers=4, window=20)
+    for _ in range(100):
+        hedger.call(slow_call)
+    assert hedger.stats()['hedged'] <= 100 * 10 / 100
+
+def test_no_hedging_before_min_samples():
+    calls = []
+    lock = threading.Lock()
+
+    def record_call():
+        with lock:
+            calls.append(threading.current_thread().name)
+        return 'ok'
+
+    hedger = Hedger('test', LatencyRecorder('empty'), min_samples=20)
+    assert hedger.call(record_call) == 'ok'
+    assert len(calls) == 1
+    assert hedger.stats()['hedge_delay_ms'] is None
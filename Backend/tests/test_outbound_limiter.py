@@ -0,0 +1,184 @@
+import time
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+import requests
+from services.outbound_limiter import OutboundLimiter, UpstreamRejected
+
+class StandInUpstream:
+    """
+    Local HTTP server standing in for an external service
+
+    GET /status/<code> answers with that status; GET /hold/<name>/<code>
+    waits until release(name) before answering.
+    """
+
+    def __init__(self):
+        self.hits = Counter()
+        self.holds = {}
+        upstream = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                parts = self.path.strip('/').split('/')
+                upstream.hits[parts[0]] += 1
+                if parts[0] == 'hold':
+                    upstream.hold(parts[1]).wait(5)
+                self.send_response(int(parts[-1]))
+                self.end_headers()
+                self.wfile.write(b'ok')
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}'
+        threading.Thread(target=self.server.serve_forever, args=(0.05,), daemon=True).start()
+
+    def hold(self, name):
+        return self.holds.setdefault(name, threading.Event())
+
+    def release(self, name):
+        self.hold(name).set()
+
+    def close(self):
+        for event in self.holds.values():
+            event.set()
+        self.server.shutdown()
+        self.server.server_close()
+
+@pytest.fixture
+def upstream():
+    server = StandInUpstream()
+    yield server
+    server.close()
+
+def fetch(url):
+    response = requests.get(url, timeout=5)
+    response.raise_for_status()
+    return response.status_code
+
+def make_limiter(**overrides):
+    settings = dict(rate=0, burst=1, max_in_flight=1, max_queue=0, queue_timeout=1,
+                    failure_threshold=1, reset_timeout=0.2)
+    settings.update(overrides)
+    return OutboundLimiter('stand-in', **settings)
+
+def start_call(limiter, url):
+    """
+    Run limiter.call(fetch, url) on a thread and wait until it has been admitted
+    """
+    outcome = {}
+
+    def run():
+        try:
+            outcome['result'] = limiter.call(fetch, url)
+        except Exception as e:
+            outcome['error'] = e
+
+    in_flight = limiter.stats()['in_flight']
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 2
+    while limiter.stats()['in_flight'] == in_flight and time.monotonic() < deadline:
+        time.sleep(0.005)
+    return thread, outcome
+
+def rejection(limiter, url, **kwargs):
+    with pytest.raises(UpstreamRejected) as info:
+        limiter.call(fetch, url, **kwargs)
+    return info.value.reason
+
+def open_circuit(limiter, upstream):
+    with pytest.raises(requests.HTTPError):
+        limiter.call(fetch, f'{upstream.url}/status/503')
+    assert limiter.breaker.state == 'open'
+
+def test_queue_full(upstream):
+    limiter = make_limiter(max_queue=0)
+    thread, outcome = start_call(limiter, f'{upstream.url}/hold/a/200')
+
+    assert rejection(limiter, f'{upstream.url}/status/200') == 'queue_full'
+    upstream.release('a')
+    thread.join(5)
+    assert outcome['result'] == 200
+    assert limiter.call(fetch, f'{upstream.url}/status/200') == 200
+
+def test_deadline_while_queued(upstream):
+    limiter = make_limiter(max_queue=1, queue_timeout=0.1)
+    thread, _ = start_call(limiter, f'{upstream.url}/hold/a/200')
+
+    started = time.monotonic()
+    assert rejection(limiter, f'{upstream.url}/status/200') == 'deadline'
+    assert time.monotonic() - started < 1
+    upstream.release('a')
+    thread.join(5)
+    assert limiter.stats()['queue_depth'] == 0
+
+def test_deadline_for_rate_limit(upstream):
+    limiter = make_limiter(rate=1, burst=1)
+    assert limiter.call(fetch, f'{upstream.url}/status/200') == 200
+
+    assert rejection(limiter, f'{upstream.url}/status/200', timeout=0.1) == 'deadline'
+    assert limiter.stats()['in_flight'] == 0
+    assert upstream.hits['status'] == 1
+
+def test_open_circuit_rejects_without_calling_upstream(upstream):
+    limiter = make_limiter(failure_threshold=2, reset_timeout=60)
+    for _ in range(2):
+        with pytest.raises(requests.HTTPError):
+            limiter.call(fetch, f'{upstream.url}/status/503')
+
+    assert rejection(limiter, f'{upstream.url}/status/200') == 'circuit_open'
+    assert upstream.hits['status'] == 2
+
+def test_client_errors_do_not_open_circuit(upstream):
+    limiter = make_limiter(failure_threshold=1)
+    with pytest.raises(requests.HTTPError):
+        limiter.call(fetch, f'{upstream.url}/status/404')
+    assert limiter.breaker.state == 'closed'
+
+def test_half_open_admits_a_single_trial(upstream):
+    limiter = make_limiter(max_in_flight=4)
+    open_circuit(limiter, upstream)
+    time.sleep(0.25)
+
+    trial, outcome = start_call(limiter, f'{upstream.url}/hold/trial/200')
+    assert limiter.breaker.state == 'half_open'
+    assert rejection(limiter, f'{upstream.url}/status/200') == 'circuit_open'
+
+    upstream.release('trial')
+    trial.join(5)
+    assert outcome['result'] == 200
+    assert limiter.breaker.state == 'closed'
+    assert limiter.call(fetch, f'{upstream.url}/status/200') == 200
+
+def test_failed_trial_reopens_circuit(upstream):
+    limiter = make_limiter()
+    open_circuit(limiter, upstream)
+    time.sleep(0.25)
+
+    with pytest.raises(requests.HTTPError):
+        limiter.call(fetch, f'{upstream.url}/status/503')
+    assert limiter.breaker.state == 'open'
+    assert rejection(limiter, f'{upstream.url}/status/200') == 'circuit_open'
+
+@pytest.mark.parametrize('stale_status', [200, 404, 503])
+def test_stale_call_cannot_release_the_trial(upstream, stale_status):
+    limiter = make_limiter(max_in_flight=4)
+    stale, _ = start_call(limiter, f'{upstream.url}/hold/stale/{stale_status}')
+    open_circuit(limiter, upstream)
+    time.sleep(0.25)
+    trial, outcome = start_call(limiter, f'{upstream.url}/hold/trial/200')
+
+    # A call admitted before the circuit opened finishes while the trial runs
+    upstream.release('stale')
+    stale.join(5)
+    assert limiter.breaker.state == 'half_open'
+    assert rejection(limiter, f'{upstream.url}/status/200') == 'circuit_open'
+
+    upstream.release('trial')
+    trial.join(5)
+    assert outcome['result'] == 200
+    assert limiter.breaker.state == 'closed'
@@ -0,0 +1,37 @@
+from fractions import Fraction
+import pytest
+from services.servings_scaler import scale_quantities, scale_recipe
+
+@pytest.mark.parametrize('line, factor, expected', [
+    ('1 cup (250 ml) milk', 2, '2 cups (500 ml) milk'),
+    ('2 cups rice', Fraction(1, 2), '1 cup rice'),
+    ('1 egg', 2, '2 eggs'),
+    ('2 eggs, beaten', Fraction(1, 2), '1 egg, beaten'),
+    ('2-3 green chillies, slit', 2, '4-6 green chillies, slit'),
+    ('1 bay leaf', 2, '2 bay leaves'),
+    ('1 large onion, finely chopped', 2, '2 large onions, finely chopped'),
+    ('1 tbsp oil', 2, '2 tbsp oil'),
+    ('3 cloves garlic', Fraction(1, 3), '1 clove garlic'),
+    ('2 to 3 cups water', Fraction(1, 2), '1 to 1 1/2 cups water'),
+    ('1 kg chicken (cut into 2 inch pieces)', Fraction(1, 2), '0.5 kg chicken (cut into 2 inch pieces)'),
+    ('Salt to taste', 2, 'Salt to taste'),
+])
+def test_scale_ingredient_line(line, factor, expected):
+    assert scale_quantities(line, Fraction(factor)) == expected
+
+def test_numbers_without_unit_are_only_counts_at_line_start():
+    assert scale_quantities('Chicken 65 masala, 2 tbsp', 2) == 'Chicken 65 masala, 4 tbsp'
+    assert scale_quantities('2 onions', 2, counts=False) == '2 onions'
+
+def test_scale_recipe_scales_instructions_and_marks_the_copy():
+    recipe = {
+        'ingredients': ['1 cup rice', '2 onions'],
+        'instructions': ['Wash 1 cup rice and soak for 20 minutes', 'Add 2 onions']
+    }
+    scaled = scale_recipe(recipe, 2, 4)
+    assert scaled['ingredients'] == ['2 cups rice', '4 onions']
+    assert scaled['instructions'] == ['Wash 2 cups rice and soak for 20 minutes', 'Add 2 onions']
+    assert scaled['servings'] == '4'
+    assert scaled['scaled_from'] == '2'
+    assert scale_recipe(scaled, 4, 8)['scaled_from'] == '2'
+    assert 'scaled_from' not in recipe
@@ -0,0 +1,28 @@
+import json
+import numpy as np
+from services.similarity_index import EmbeddingIndex, INDEX_FORMAT_VERSION
+
+RECIPE = {'name': 'Dal Makhani'}
+
+def test_match_requires_same_predicted_class():
+    index = EmbeddingIndex(threshold=0.95)
+    embedding = np.array([1.0, 0.0, 0.2])
+    index.add(embedding, 'dal_makhani', 2, [], RECIPE)
+
+    assert index.query(embedding * 3, 'dal_makhani', 2, [])[0] == RECIPE
+    assert index.query(embedding, 'chana_masala', 2, [])[0] is None
+    assert index.query(embedding, 'dal_makhani', 4, [])[0] is None
+
+def test_index_from_an_older_format_is_discarded(tmp_path):
+    path = str(tmp_path / 'index')
+    index = EmbeddingIndex(path, threshold=0.95)
+    index.add(np.ones(4), 'dal_makhani', 2, ['milk'], RECIPE)
+    index.save()
+    assert EmbeddingIndex(path).size() == 1
+
+    with open(f'{path}.json') as f:
+        metadata = json.load(f)
+    metadata['version'] = INDEX_FORMAT_VERSION - 1
+    with open(f'{path}.json', 'w') as f:
+        json.dump(metadata, f)
+    assert EmbeddingIndex(path).size() == 0
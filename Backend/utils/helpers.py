@@ -1,6 +1,8 @@
+import io
 import os
 import logging
 import base64
+from PIL import Image, ImageOps
 
 logger = logging.getLogger(__name__)
 
@@ -25,6 +27,103 @@ def save_uploaded_image(file, directory='uploads'):
         logger.error(f"Error saving image: {str(e)}")
         raise
 
+def normalize_allergies(allergies):
+    """
+    Normalize an allergy list for use in cache keys
+    
+    Returns:
+        Sorted list of unique, lower-cased, non-empty allergy names
+    """
+    return sorted({allergy.strip().lower() for allergy in allergies or [] if allergy.strip()})
+
+def open_image(image_data, target_size=None):
+    """
+    Decode image bytes, decoding JPEGs directly at a reduced scale when possible
+    
+    JPEG draft mode lets libjpeg decode at 1/2, 1/4 or 1/8 scale, picking the
+    smallest scale that still keeps both sides at least target_size, so a
+    later Resize(target_size) sees the same geometry at a fraction of the
+    decode cost. Other formats are fully decoded.
+    
+    Args:
+        image_data: Binary image data
+        target_size: Smallest side needed by the consumer (optional)
+        
+    Returns:
+        Loaded PIL Image
+    """
+    try:
+        image = Image.open(io.BytesIO(image_data))
+        if target_size and image.format == 'JPEG':
+            original_size = image.size
+            image.draft('RGB', (target_size, target_size))
+            if image.size != original_size:
+                logger.debug(f"Draft-decoding JPEG at {image.size} instead of {original_size}")
+        image.load()
+        return image
+    except Exception as e:
+        logger.error(f"Error decoding image: {str(e)}")
+        raise
+
+# Formats Gemini accepts as inline image data
+UPLOAD_MIME_TYPES = {'JPEG': 'image/jpeg', 'PNG': 'image/png', 'WEBP': 'image/webp'}
+
+def detect_mime_type(image_data, default='image/jpeg'):
+    """
+    MIME type of image bytes from their header, or default if unsupported
+    """
+    try:
+        return UPLOAD_MIME_TYPES.get(Image.open(io.BytesIO(image_data)).format, default)
+    except Exception:
+        return default
+
+def prepare_image_for_upload(image_data, max_edge, quality):
+    """
+    Shrink an image before it is sent to an external API
+    
+    The image is downscaled so its longest edge is at most max_edge (using
+    JPEG draft decoding where possible), EXIF orientation is applied and it
+    is re-encoded as JPEG. If the original is already small enough and in a
+    supported format, and re-encoding would not make it smaller, the
+    original bytes are kept.
+    
+    Args:
+        image_data: Binary image data
+        max_edge: Maximum length of the longest side in pixels
+        quality: JPEG quality for the re-encoded image
+        
+    Returns:
+        (image bytes, MIME type)
+    """
+    try:
+        image = Image.open(io.BytesIO(image_data))
+        original_mime = UPLOAD_MIME_TYPES.get(image.format)
+        fits = max(image.size) <= max_edge
+
+        if image.format == 'JPEG' and not fits:
+            image.draft('RGB', (max_edge, max_edge))
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((max_edge, max_edge), Image.LANCZOS)
+
+        if image.mode in ('RGBA', 'LA', 'P'):
+            image = image.convert('RGBA')
+            background = Image.new('RGB', image.size, (255, 255, 255))
+            background.paste(image, mask=image.getchannel('A'))
+            image = background
+        elif image.mode != 'RGB':
+            image = image.convert('RGB')
+
+        buffer = io.BytesIO()
+        image.save(buffer, 'JPEG', quality=quality, optimize=True)
+        encoded = buffer.getvalue()
+
+        if original_mime and fits and len(image_data) <= len(encoded):
+            return image_data, original_mime
+        return encoded, 'image/jpeg'
+    except Exception as e:
+        logger.error(f"Error preparing image for upload: {str(e)}")
+        raise
+
 def create_audio_data_uri(audio_data):
     """
     Create a data URI for audio data
@@ -0,0 +1,137 @@
+import json
+
+WHITESPACE = ' \t\r\n'
+
+class IncrementalJSONParser:
+    """
+    Incremental parser for one JSON object arriving in text chunks
+
+    Anything before the first '{' (such as a ```json fence) and after the
+    matching '}' is ignored. feed() returns the events completed by the new
+    text, in order:
+        ('item', key, index, value)  an element of a top-level array field
+        ('field', key, value)        a complete top-level field
+    Values are decoded with json.loads once their text is complete, so
+    partial strings are never emitted.
+    """
+
+    def __init__(self):
+        self.buffer = ''
+        self.done = False
+        self._pos = 0
+        self._root_start = None
+        self._root_end = None
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string_start = None
+        self._expect_key = False
+        self._key = None
+        self._await_value = False
+        self._value_start = None
+        self._array_key = None
+        self._array_index = 0
+        self._await_item = False
+        self._item_start = None
+
+    def feed(self, text):
+        self.buffer += text
+        events = []
+        buffer = self.buffer
+
+        for i in range(self._pos, len(buffer)):
+            if self.done:
+                break
+            c = buffer[i]
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == '\\':
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    if self._depth == 1 and self._expect_key:
+                        self._key = json.loads(buffer[self._string_start:i + 1])
+                        self._expect_key = False
+                continue
+
+            if self._root_start is None:
+                if c == '{':
+                    self._root_start = i
+                    self._depth = 1
+                    self._expect_key = True
+                continue
+
+            if c in WHITESPACE:
+                continue
+            if self._await_value:
+                self._value_start = i
+                self._await_value = False
+            if self._await_item and c != ']':
+                self._item_start = i
+                self._await_item = False
+
+            if c == '"':
+                self._in_string = True
+                self._string_start = i
+            elif c == ':' and self._depth == 1:
+                self._await_value = True
+            elif c in '{[':
+                self._depth += 1
+                if c == '[' and self._depth == 2:
+                    self._array_key = self._key
+                    self._array_index = 0
+                    self._await_item = True
+            elif c in ',]' and self._depth == 2 and self._array_key is not None:
+                if self._item_start is not None:
+                    value = json.loads(buffer[self._item_start:i])
+                    events.append(('item', self._array_key, self._array_index, value))
+                    self._array_index += 1
+                    self._item_start = None
+                if c == ',':
+                    self._await_item = True
+                else:
+                    self._depth -= 1
+                    self._array_key = None
+                    self._await_item = False
+            elif c in '}]':
+                self._depth -= 1
+                if self._depth == 0:
+                    events.extend(self._complete_field(buffer, i))
+                    self._root_end = i + 1
+                    self.done = True
+            elif c == ',' and self._depth == 1:
+                events.extend(self._complete_field(buffer, i))
+                self._expect_key = True
+
+        self._pos = len(buffer)
+        return events
+
+    def _complete_field(self, buffer, end):
+        if self._key is None or self._value_start is None:
+            return []
+        event = ('field', self._key, json.loads(buffer[self._value_start:end]))
+        self._key = None
+        self._value_start = None
+        return [event]
+
+    def result(self):
+        """
+        Returns:
+            The complete decoded object
+
+        Raises:
+            ValueError: If no complete object has been fed
+        """
+        if not self.done:
+            raise ValueError("Incomplete JSON object")
+        return json.loads(self.buffer[self._root_start:self._root_end])
+
+def extract_json(text):
+    """
+    Decode the first JSON object in model output, ignoring code fences or prose around it
+    """
+    parser = IncrementalJSONParser()
+    parser.feed(text)
+    return parser.result()
@@ -0,0 +1,59 @@
+import math
+import threading
+from collections import deque, Counter
+
+class LatencyRecorder:
+    """
+    Rolling window of call latencies with outcome counters
+
+    Args:
+        name: Name reported in stats
+        window: Number of most recent latencies kept for percentiles
+    """
+
+    def __init__(self, name, window=1000):
+        self.name = name
+        self._latencies = deque(maxlen=window)
+        self._counters = Counter()
+        self._lock = threading.Lock()
+
+    def record(self, latency_ms, outcome='ok'):
+        with self._lock:
+            self._latencies.append(latency_ms)
+            self._counters[outcome] += 1
+
+    def increment(self, counter, amount=1):
+        with self._lock:
+            self._counters[counter] += amount
+
+    def count(self):
+        with self._lock:
+            return len(self._latencies)
+
+    def percentile(self, q):
+        """
+        Nearest-rank percentile (q in 0-100) of the recorded window, or None if empty
+        """
+        with self._lock:
+            ordered = sorted(self._latencies)
+        if not ordered:
+            return None
+        return ordered[max(1, math.ceil(q / 100 * len(ordered))) - 1]
+
+    def stats(self):
+        with self._lock:
+            ordered = sorted(self._latencies)
+            counters = dict(self._counters)
+
+        def pick(q):
+            return round(ordered[max(1, math.ceil(q / 100 * len(ordered))) - 1], 2) if ordered else None
+
+        return {
+            'name': self.name,
+            'window': len(ordered),
+            'mean_ms': round(sum(ordered) / len(ordered), 2) if ordered else None,
+            'p50_ms': pick(50),
+            'p95_ms': pick(95),
+            'p99_ms': pick(99),
+            'counters': counters
+        }
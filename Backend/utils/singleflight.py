@@ -0,0 +1,82 @@
+import copy
+import logging
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+
+logger = logging.getLogger(__name__)
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key into one execution
+
+    The first caller for a key (the leader) runs the function in its own
+    thread; callers arriving while it is in flight wait for its outcome
+    instead of starting another call. The result, or the exception, is handed
+    to every waiter and the key is released as soon as the leader finishes,
+    so nothing is cached beyond the in-flight window.
+
+    Args:
+        name: Name used in log messages and stats
+        wait_timeout: Seconds a waiter waits for the leader before giving up (None waits forever)
+    """
+
+    def __init__(self, name='singleflight', wait_timeout=None):
+        self.name = name
+        self.wait_timeout = wait_timeout
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.coalesced = 0
+        self.wait_timeouts = 0
+
+    def do(self, key, function, *args, **kwargs):
+        """
+        Run function(*args, **kwargs), or wait for the identical call already in flight
+
+        Waiters receive a deep copy of the leader's result, so callers may
+        modify what they get back.
+
+        Raises:
+            TimeoutError: If a waiter gives up on the leader after wait_timeout seconds
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+                self.leaders += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            try:
+                return copy.deepcopy(future.result(timeout=self.wait_timeout))
+            except FutureTimeoutError:
+                with self._lock:
+                    self.wait_timeouts += 1
+                raise TimeoutError(f"Timed out after {self.wait_timeout}s waiting for in-flight {self.name} call")
+
+        try:
+            result = function(*args, **kwargs)
+        except BaseException as e:
+            self._release(key)
+            future.set_exception(e)
+            raise
+        self._release(key)
+        future.set_result(result)
+        return result
+
+    def _release(self, key):
+        with self._lock:
+            self._calls.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'name': self.name,
+                'in_flight': len(self._calls),
+                'leaders': self.leaders,
+                'coalesced': self.coalesced,
+                'wait_timeouts': self.wait_timeouts
+            }